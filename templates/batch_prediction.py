@@ -0,0 +1,228 @@
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chunk_processing import process_pool_context
+from data_loading import iter_csv, iter_jsonl, iter_parquet
+
+# --- Configuration ---
+INPUT_PATTERN = "batch_input/part-*.csv"
+OUTPUT_DIR = "batch_output"
+MODEL_PATH = "model.keras"  # Keras (.keras/.h5/SavedModel dir) or sklearn (.joblib/.pkl)
+FEATURE_COLUMNS = None  # None uses every column that is not a passthrough column
+PASSTHROUGH_COLUMNS = ["id"]
+BATCH_SIZE = 1024
+MANIFEST_FILE = "manifest.json"
+
+# --- Model loading (once per worker process) ---
+_worker_model = None
+
+def load_model(model_path):
+    """Loads a Keras or sklearn model from disk based on its path."""
+    if model_path.endswith((".joblib", ".pkl")):
+        import joblib
+        return joblib.load(model_path)
+    import tensorflow as tf
+    return tf.keras.models.load_model(model_path)
+
+def _init_worker(model_path):
+    global _worker_model
+    _worker_model = load_model(model_path)
+
+def _predict_batch(df, feature_columns, passthrough_columns):
+    """Scores one micro-batch in a worker and returns passthrough columns plus predictions."""
+    features = df[feature_columns].to_numpy(dtype=np.float32)
+    if hasattr(_worker_model, "predict_on_batch"):
+        predictions = np.asarray(_worker_model.predict_on_batch(features))
+    else:
+        predictions = np.asarray(_worker_model.predict(features))
+
+    out = df[passthrough_columns].reset_index(drop=True)
+    if predictions.ndim == 1 or predictions.shape[1] == 1:
+        out["prediction"] = predictions.reshape(-1)
+    else:
+        for i in range(predictions.shape[1]):
+            out[f"prediction_{i}"] = predictions[:, i]
+    return out
+
+# --- Input and output shards ---
+def iter_input(path, batch_size):
+    """Streams one input shard as DataFrame micro-batches based on its extension."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return iter_csv(path, batch_size=batch_size)
+    if extension in (".json", ".jsonl"):
+        return iter_jsonl(path, batch_size=batch_size)
+    if extension == ".parquet":
+        return iter_parquet(path, batch_size=batch_size)
+    raise ValueError(f"Unsupported input format: {path}")
+
+class ShardWriter:
+    """Writes one output shard to a temporary file and renames it into place on close."""
+
+    def __init__(self, path, output_format):
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.output_format = output_format
+        self.rows = 0
+        self._file = None
+        self._parquet_writer = None
+
+    def write(self, df):
+        if self.output_format == "jsonl":
+            if self._file is None:
+                self._file = open(self.tmp_path, "w")
+            df.to_json(self._file, orient="records", lines=True)
+        elif self.output_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            self._parquet_writer.write_table(table)
+        else:
+            raise ValueError(f"Unsupported output format: {self.output_format}")
+        self.rows += len(df)
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is None and self._parquet_writer is None:
+            open(self.tmp_path, "w").close()
+        os.replace(self.tmp_path, self.path)
+
+def output_name(path, extension, taken):
+    """Output shard name derived from the input shard's basename, suffixed if another input already uses it."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    name = f"predictions-{stem}.{extension}"
+    suffix = 2
+    while name in taken:
+        name = f"predictions-{stem}-{suffix}.{extension}"
+        suffix += 1
+    return name
+
+def load_manifest(output_dir):
+    """Returns the manifest of completed shards, or an empty one for a fresh run."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {"shards": {}}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(output_dir, manifest):
+    """Writes the manifest atomically so a crash never leaves it half written."""
+    path = os.path.join(output_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+# --- Batch prediction engine ---
+def run_batch_prediction(input_pattern, output_dir, model_path, feature_columns=None,
+                         passthrough_columns=None, batch_size=BATCH_SIZE, num_workers=None,
+                         output_format="jsonl", max_in_flight=None):
+    """
+    Scores input shards locally and writes one output shard per input shard.
+
+    Input shards are streamed in micro-batches of batch_size rows that are
+    scored on a process pool, with at most max_in_flight batches queued so
+    memory stays bounded. The queue runs across shard boundaries, so shards
+    smaller than max_in_flight batches still keep every worker busy. Results
+    are written in input order. An output shard is recorded in the manifest
+    only after it is fully written and renamed into place, so a rerun after
+    a crash skips completed shards and resumes with the first unfinished one. Output shards are named after their input
+    shard, so adding inputs between runs never renames finished outputs, and
+    resuming with a different model_path or output_format is refused.
+
+    Args:
+        input_pattern: glob of CSV, JSON lines or Parquet input shards
+        output_dir: directory for output shards and the manifest
+        model_path: Keras or sklearn model path, loaded once per worker
+        feature_columns: columns fed to the model, defaults to every non-passthrough column
+        passthrough_columns: columns copied to the output next to the predictions
+        batch_size: rows per micro-batch
+        num_workers: size of the process pool, defaults to the number of CPUs
+        output_format: "jsonl" or "parquet"
+        max_in_flight: maximum queued micro-batches, defaults to 2 * num_workers
+
+    Returns:
+        The manifest dictionary.
+    """
+    paths = sorted(glob.glob(input_pattern))
+    if not paths:
+        print(f"Error: no input shards match {input_pattern}")
+        return None
+
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    for key, value in (("model_path", model_path), ("output_format", output_format)):
+        if manifest["shards"] and manifest.get(key) != value:
+            raise ValueError(f"{output_dir} holds a run with {key}={manifest.get(key)!r}, "
+                             f"refusing to resume with {key}={value!r}; use a new output_dir")
+    manifest.update({"model_path": model_path, "input_pattern": input_pattern, "output_format": output_format})
+    passthrough_columns = list(passthrough_columns or [])
+    num_workers = num_workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * num_workers
+    extension = "jsonl" if output_format == "jsonl" else "parquet"
+
+    pending = [path for path in paths if path not in manifest["shards"]]
+    print(f"{len(paths) - len(pending)} of {len(paths)} shards already completed, scoring {len(pending)}")
+
+    start = time.perf_counter()
+    total_rows = 0
+    taken = {shard["output"] for shard in manifest["shards"].values()}
+    # (path, writer, future) per micro-batch, then (path, writer, None) once the shard's input is exhausted
+    in_flight = deque()
+    queued_batches = 0
+
+    def drain_one():
+        nonlocal total_rows, queued_batches
+        path, writer, future = in_flight.popleft()
+        if future is not None:
+            writer.write(future.result())
+            queued_batches -= 1
+            return
+        writer.close()
+        manifest["shards"][path] = {"output": os.path.basename(writer.path), "rows": writer.rows}
+        save_manifest(output_dir, manifest)
+        total_rows += writer.rows
+        print(f"Completed shard {path} -> {writer.path} ({writer.rows} rows)")
+
+    with ProcessPoolExecutor(max_workers=num_workers, mp_context=process_pool_context(),
+                             initializer=_init_worker, initargs=(model_path,)) as executor:
+        for path in pending:
+            name = output_name(path, extension, taken)
+            taken.add(name)
+            writer = ShardWriter(os.path.join(output_dir, name), output_format)
+            for df in iter_input(path, batch_size):
+                columns = feature_columns or [c for c in df.columns if c not in passthrough_columns]
+                in_flight.append((path, writer, executor.submit(_predict_batch, df, columns, passthrough_columns)))
+                queued_batches += 1
+                while queued_batches >= max_in_flight:
+                    drain_one()
+            in_flight.append((path, writer, None))
+        while in_flight:
+            drain_one()
+
+    elapsed = time.perf_counter() - start
+    print(f"Scored {total_rows} rows in {elapsed:.1f}s ({total_rows / max(elapsed, 1e-9):,.0f} rows/s)")
+    return manifest
+
+# --- Main ---
+if __name__ == "__main__":
+    run_batch_prediction(
+        input_pattern=INPUT_PATTERN,
+        output_dir=OUTPUT_DIR,
+        model_path=MODEL_PATH,
+        feature_columns=FEATURE_COLUMNS,
+        passthrough_columns=PASSTHROUGH_COLUMNS,
+        batch_size=BATCH_SIZE,
+    )
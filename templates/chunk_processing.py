@@ -0,0 +1,184 @@
+import itertools
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+# configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# --- Process pools ---
+def process_pool_context():
+    """
+    Multiprocessing context for the process pools in these templates.
+
+    Forking a process that has already imported TensorFlow copies its thread
+    pools and locks into the child in an unusable state, so pools use spawn
+    once TensorFlow is loaded. Otherwise the platform default is used (fork
+    on Linux), which starts workers without re-importing anything.
+    """
+    if "tensorflow" in sys.modules:
+        return multiprocessing.get_context("spawn")
+    return multiprocessing.get_context()
+
+# --- Chunked map engine ---
+def _iter_chunks(data, chunk_size):
+    """
+    Yields (start, chunk) pairs.
+
+    DataFrames, NumPy arrays and other sliceable sequences are sliced, so
+    NumPy chunks are views rather than copies; any other iterable is batched
+    into lists.
+    """
+    if hasattr(data, "iloc"):
+        for start in range(0, len(data), chunk_size):
+            yield start, data.iloc[start:start + chunk_size]
+    elif hasattr(data, "__getitem__") and hasattr(data, "__len__") and not isinstance(data, dict):
+        for start in range(0, len(data), chunk_size):
+            yield start, data[start:start + chunk_size]
+    else:
+        iterator = iter(data)
+        start = 0
+        while True:
+            chunk = list(itertools.islice(iterator, chunk_size))
+            if not chunk:
+                return
+            yield start, chunk
+            start += len(chunk)
+
+_worker_shared_arrays = {}
+
+def _process_shared_chunk(func, name, shape, dtype, start, stop):
+    """Runs func on a view of a shared-memory array; each worker attaches to a block once."""
+    if name not in _worker_shared_arrays:
+        from multiprocessing import shared_memory
+        block = shared_memory.SharedMemory(name=name)
+        _worker_shared_arrays[name] = (block, np.ndarray(shape, dtype=dtype, buffer=block.buf))
+    return func(_worker_shared_arrays[name][1][start:stop])
+
+def iter_chunk_results(data, func, chunk_size=1000, backend="thread", max_workers=None,
+                       max_in_flight=None, ordered=True):
+    """
+    Maps func over chunks of data on a thread or process pool.
+
+    At most max_in_flight chunks are queued or running at once, so a large
+    or lazy input is never materialized as tasks all at once. With the
+    process backend a NumPy array is copied once into shared memory and
+    workers get zero-copy views of their rows instead of pickled chunks;
+    func must then be a module-level function, ideally in a module that does
+    not import TensorFlow, since workers import the module that defines it.
+
+    Args:
+        data: sized sequence, NumPy array, DataFrame or any iterable
+        func: function applied to each chunk
+        chunk_size: items (rows) per chunk
+        backend: "thread" for NumPy/IO-bound work that releases the GIL, "process" for pure Python work
+        max_workers: pool size, defaults to the number of CPUs
+        max_in_flight: maximum queued chunks, defaults to 2 * max_workers
+        ordered: yield in chunk order, otherwise as chunks complete
+
+    Yields:
+        (chunk_index, result) pairs.
+    """
+    if backend not in ("thread", "process"):
+        raise ValueError(f"Unsupported backend: {backend}")
+    max_workers = max_workers or os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * max_workers
+
+    if backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    else:
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=process_pool_context())
+
+    block = None
+    pending = deque() if ordered else {}
+    try:
+        if backend == "process" and isinstance(data, np.ndarray) and not data.dtype.hasobject:
+            from multiprocessing import shared_memory
+            block = shared_memory.SharedMemory(create=True, size=max(1, data.nbytes))
+            np.ndarray(data.shape, dtype=data.dtype, buffer=block.buf)[...] = data
+
+            def submit(start, chunk):
+                return executor.submit(_process_shared_chunk, func, block.name, data.shape, data.dtype.str,
+                                       start, start + len(chunk))
+        else:
+            def submit(start, chunk):
+                return executor.submit(func, chunk)
+
+        for index, (start, chunk) in enumerate(_iter_chunks(data, chunk_size)):
+            future = submit(start, chunk)
+            if ordered:
+                pending.append((index, future))
+                if len(pending) >= max_in_flight:
+                    index, future = pending.popleft()
+                    yield index, future.result()
+            else:
+                pending[future] = index
+                if len(pending) >= max_in_flight:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield pending.pop(future), future.result()
+        if ordered:
+            while pending:
+                index, future = pending.popleft()
+                yield index, future.result()
+        else:
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield pending.pop(future), future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if block is not None:
+            block.close()
+            block.unlink()
+
+def process_data_in_chunks(data, chunk_size=1000, func=len, backend="thread", max_workers=None,
+                           max_in_flight=None, ordered=True, report_every=10):
+    """
+    Processes data in chunks to handle large datasets.
+
+    Runs func over every chunk with iter_chunk_results and logs progress and
+    throughput every report_every chunks. The default func only counts the
+    items of each chunk.
+
+    Returns:
+        List of per-chunk results, in chunk order (or completion order when
+        ordered is False), or None if processing failed.
+    """
+    try: 
+        logging.info(f"Processing data in chunks of size {chunk_size} ({backend} pool)...")
+        total = len(data) if hasattr(data, "__len__") else None
+        num_chunks = -(-total // chunk_size) if total is not None else "?"
+        start = time.perf_counter()
+        results = []
+        for done, (_, result) in enumerate(iter_chunk_results(data, func, chunk_size, backend, max_workers,
+                                                              max_in_flight, ordered), 1):
+            results.append(result)
+            if done % report_every == 0 or done == num_chunks:
+                items = min(done * chunk_size, total) if total is not None else done * chunk_size
+                elapsed = time.perf_counter() - start
+                logging.info(f"Processed chunk {done}/{num_chunks} ({items / elapsed:,.0f} items/sec)")
+        logging.info(f"Data Processing Completed in {time.perf_counter() - start:.2f}s")
+        return results
+    except Exception as e:
+        logging.error(f"Data Processing Failed: {e}")
+        return None
+
+# example usage
+def _example_row_norms(chunk):
+    return np.sqrt(np.einsum("ij,ij->i", chunk, chunk))
+
+def example_chunk_processing():
+    features = np.random.default_rng(0).normal(size=(1_000_000, 64))
+    norms = process_data_in_chunks(features, chunk_size=50_000, func=_example_row_norms, backend="process")
+    logging.info(f"Computed {sum(len(n) for n in norms)} row norms")
+
+# --- Main ---
+if __name__ == "__main__":
+    example_chunk_processing()
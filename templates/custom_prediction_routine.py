@@ -0,0 +1,291 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from batch_prediction import load_model
+
+# --- Configuration (Vertex AI sets the AIP_* variables in a serving container) ---
+HTTP_PORT = int(os.environ.get("AIP_HTTP_PORT", 8080))
+PREDICT_ROUTE = os.environ.get("AIP_PREDICT_ROUTE", "/predict")
+HEALTH_ROUTE = os.environ.get("AIP_HEALTH_ROUTE", "/health")
+ARTIFACTS_URI = os.environ.get("AIP_STORAGE_URI", "model.keras")
+MAX_BATCH_SIZE = 64
+MAX_QUEUE_DELAY_MS = 5
+
+# --- Predictor ---
+class Predictor:
+    """
+    Custom prediction routine with the same hooks as Vertex AI's Predictor.
+
+    load() runs once at startup. preprocess() and postprocess() run per
+    request, while predict() runs on a dynamic batch that may hold the
+    instances of many concurrent requests. Subclass and override the hooks
+    for custom input/output formats.
+    """
+
+    def load(self, artifacts_uri):
+        self._model = load_model(artifacts_uri)
+
+    def preprocess(self, prediction_input):
+        """Turns one request body into an array of instances."""
+        return np.asarray(prediction_input["instances"], dtype=np.float32)
+
+    def predict(self, instances):
+        """Scores one batch of instances."""
+        if hasattr(self._model, "predict_on_batch"):
+            return np.asarray(self._model.predict_on_batch(instances))
+        return np.asarray(self._model.predict(instances))
+
+    def postprocess(self, prediction_results):
+        """Turns one request's slice of the batch output into the response body."""
+        return {"predictions": prediction_results.tolist()}
+
+# --- Dynamic batching ---
+class DynamicBatcher:
+    """
+    Coalesces concurrent requests into batches before calling the model.
+
+    A batch is closed when the next request would take it past
+    max_batch_size instances or when the oldest request has waited
+    max_queue_delay_ms, whichever comes first; a request larger than
+    max_batch_size is split into several.
+    The model runs on a thread pool so the event loop keeps accepting
+    requests while a batch is being scored; num_batch_workers batches can be
+    scored at the same time.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE, max_queue_delay_ms=MAX_QUEUE_DELAY_MS,
+                 num_batch_workers=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_queue_delay = max_queue_delay_ms / 1000
+        self.num_batch_workers = num_batch_workers
+        self.batch_sizes = []
+        self._queue = None
+        self._tasks = []
+        self._executor = ThreadPoolExecutor(max_workers=num_batch_workers)
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.ensure_future(self._run()) for _ in range(self.num_batch_workers)]
+        return self._tasks
+
+    async def stop(self):
+        """Cancels the batching tasks and waits for them to finish."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._executor.shutdown(wait=True)
+
+    async def submit(self, instances):
+        """Queues one request's instances and waits for its predictions."""
+        if len(instances) > self.max_batch_size:
+            parts = [instances[start:start + self.max_batch_size]
+                     for start in range(0, len(instances), self.max_batch_size)]
+            return np.concatenate(await asyncio.gather(*(self.submit(part) for part in parts)))
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        await self._queue.put((instances, future, loop.time()))
+        return await future
+
+    async def _next_batch(self, first=None):
+        """Returns (batch, carried), where carried is a request that did not fit and opens the next batch."""
+        loop = asyncio.get_running_loop()
+        batch = [first if first is not None else await self._queue.get()]
+        size = len(batch[0][0])
+        # the oldest request's wait counts from when it was queued, not from when it was dequeued
+        deadline = batch[0][2] + self.max_queue_delay
+        while size < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if size + len(item[0]) > self.max_batch_size:
+                return batch, item
+            batch.append(item)
+            size += len(item[0])
+        return batch, None
+
+    async def _score(self, batch):
+        """Scores one batch; any failure is set on the futures of this batch only."""
+        loop = asyncio.get_running_loop()
+        try:
+            inputs = np.concatenate([instances for instances, _, _ in batch])
+            self.batch_sizes.append(len(inputs))
+            outputs = await loop.run_in_executor(self._executor, self.predict_fn, inputs)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        offset = 0
+        for instances, future, _ in batch:
+            if not future.done():
+                future.set_result(outputs[offset:offset + len(instances)])
+            offset += len(instances)
+
+    async def _run(self):
+        carried = None
+        while True:
+            batch, carried = await self._next_batch(carried)
+            shapes = {np.shape(instances)[1:] for instances, _, _ in batch}
+            if len(shapes) > 1:
+                # mismatched feature widths, score requests one by one so only the bad ones fail
+                for item in batch:
+                    await self._score([item])
+            else:
+                await self._score(batch)
+
+# --- HTTP server ---
+class PredictionServer:
+    """Minimal asyncio HTTP/1.1 server (keep-alive, JSON bodies) in front of a Predictor and DynamicBatcher."""
+
+    def __init__(self, predictor, batcher, predict_route=PREDICT_ROUTE, health_route=HEALTH_ROUTE):
+        self.predictor = predictor
+        self.batcher = batcher
+        self.predict_route = predict_route
+        self.health_route = health_route
+
+    async def route(self, method, path, body):
+        if method == "GET" and path == self.health_route:
+            return "200 OK", {"status": "healthy"}
+        if method == "POST" and path == self.predict_route:
+            try:
+                instances = self.predictor.preprocess(json.loads(body))
+                predictions = await self.batcher.submit(instances)
+                return "200 OK", self.predictor.postprocess(predictions)
+            except (ValueError, KeyError) as e:
+                return "400 Bad Request", {"error": str(e)}
+            except Exception as e:
+                return "500 Internal Server Error", {"error": str(e)}
+        return "404 Not Found", {"error": f"No route for {method} {path}"}
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode().split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self.route(method, path, body)
+                data = json.dumps(payload).encode()
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="0.0.0.0", port=HTTP_PORT):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Serving {self.predict_route} on {host}:{port} "
+              f"(max batch {self.batcher.max_batch_size}, max delay {self.batcher.max_queue_delay * 1000:.1f} ms)")
+        return server
+
+# --- Benchmark ---
+async def _request(reader, writer, request):
+    writer.write(request)
+    await writer.drain()
+    await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    return await reader.readexactly(length)
+
+async def benchmark(host, port, instances, concurrency=32, requests_per_client=50, route=PREDICT_ROUTE):
+    """
+    Measures latency and throughput with concurrent keep-alive clients.
+
+    Returns:
+        Dictionary with p50/p99 latency in ms, requests/s and instances/s.
+    """
+    body = json.dumps({"instances": instances}).encode()
+    request = (f"POST {route} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {len(body)}\r\n\r\n").encode() + body
+    latencies = []
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            await _request(reader, writer, request)
+            latencies.append(time.perf_counter() - start)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "requests_per_s": len(latencies) / elapsed,
+        "instances_per_s": len(latencies) * len(instances) / elapsed,
+    }
+
+class _ToyPredictor(Predictor):
+    """Dense layer with a fixed per-call overhead, standing in for a real model in the benchmark."""
+
+    def load(self, artifacts_uri):
+        self._weights = np.random.default_rng(0).normal(size=(128, 10)).astype(np.float32)
+
+    def predict(self, instances):
+        time.sleep(0.002)  # fixed per-call cost that batching amortizes
+        return instances @ self._weights
+
+async def run_benchmark(port=HTTP_PORT + 1):
+    """Compares unbatched and dynamically batched serving of the toy predictor."""
+    instances = np.random.default_rng(1).normal(size=(1, 128)).tolist()
+    for max_batch_size, max_delay_ms in ((1, 0), (MAX_BATCH_SIZE, MAX_QUEUE_DELAY_MS)):
+        predictor = _ToyPredictor()
+        predictor.load(None)
+        batcher = DynamicBatcher(predictor.predict, max_batch_size, max_delay_ms)
+        server = await PredictionServer(predictor, batcher).serve("127.0.0.1", port)
+        results = await benchmark("127.0.0.1", port, instances)
+        server.close()
+        await server.wait_closed()
+        await batcher.stop()
+        mean_batch = np.mean(batcher.batch_sizes)
+        print(f"max_batch_size={max_batch_size}: p50 {results['p50_ms']:.1f} ms, p99 {results['p99_ms']:.1f} ms, "
+              f"{results['requests_per_s']:,.0f} req/s, mean batch {mean_batch:.1f}")
+
+async def main():
+    predictor = Predictor()
+    predictor.load(ARTIFACTS_URI)
+    batcher = DynamicBatcher(predictor.predict)
+    server = await PredictionServer(predictor, batcher).serve()
+    async with server:
+        await server.serve_forever()
+
+# --- Main ---
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "benchmark":
+        asyncio.run(run_benchmark())
+    else:
+        asyncio.run(main())
@@ -2,6 +2,10 @@ import pandas as pd
 import numpy as np
 import os 
 import json
+import glob
+import hashlib
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
 def load_csv(filepath, **kwargs):
     """Loads data from a CSV file into a pandas DataFrame"""
@@ -54,10 +58,15 @@ def load_parquet(filepath, **kwargs):
         print(f"Error Loading Parquet: {e}")
         return None
     
-def load_numpy(filepath):
-    """Loads data from a Numpy .npy file"""    
+def load_numpy(filepath, mmap_mode=None):
+    """
+    Loads data from a Numpy .npy file.
+
+    With mmap_mode='r' the array is memory-mapped instead of read, so
+    processes on one host share a single page-cache copy of the file.
+    """
     try:
-        data = np.load(filepath)
+        data = np.load(filepath, mmap_mode=mmap_mode)
         print(f"Loaded Numpy array from {filepath}, shape: {data.shape}")
         return data 
     except FileNotFoundError:
@@ -67,22 +76,510 @@ def load_numpy(filepath):
         print(f"Error Loading Numpy array: {e}")
         return None
 
-# example usage
-csv_df = load_csv("data.csv")
-json_df =  load_json("data.json")
-json_lines_df = load_json("data_lines.json")
-parquet_df = load_parquet("data.parquet")
-numpy_array = load_numpy("data.npy")
+def _report_throughput(batches, filepath):
+    """Passes batches through and prints rows/s and MB/s once the file is exhausted."""
+    start = time.perf_counter()
+    rows = 0
+    for batch in batches:
+        rows += len(batch)
+        yield batch
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    size_mb = os.path.getsize(filepath) / 1e6
+    print(f"Streamed {rows} rows from {filepath} in {elapsed:.2f}s "
+          f"({rows / elapsed:,.0f} rows/s, {size_mb / elapsed:,.1f} MB/s)")
+
+def iter_csv(filepath, batch_size=100_000, columns=None, dtype=None, **kwargs):
+    """
+    Streams a CSV file as DataFrame batches of at most batch_size rows.
+
+    Args:
+        filepath: path to the CSV file
+        batch_size: number of rows per yielded DataFrame
+        columns: optional list of columns to read, other columns are never parsed
+        dtype: optional dtype or {column: dtype} hints passed to the parser
+
+    Yields:
+        pandas DataFrames
+    """
+    if not os.path.exists(filepath):
+        print(f"Error: File not found at {filepath}")
+        return
+    with pd.read_csv(filepath, chunksize=batch_size, usecols=columns, dtype=dtype, **kwargs) as reader:
+        yield from _report_throughput(reader, filepath)
+
+def iter_jsonl(filepath, batch_size=100_000, columns=None, dtype=None, **kwargs):
+    """
+    Streams a JSON lines file as DataFrame batches of at most batch_size rows.
+
+    Each block of lines is parsed straight into a DataFrame, so only one
+    batch is held in memory at a time.
+
+    Args:
+        filepath: path to the JSON lines file
+        batch_size: number of rows per yielded DataFrame
+        columns: optional list of columns to keep
+        dtype: optional dtype or {column: dtype} hints
+
+    Yields:
+        pandas DataFrames
+    """
+    if not os.path.exists(filepath):
+        print(f"Error: file not Found at {filepath}")
+        return
+
+    def batches():
+        with pd.read_json(filepath, lines=True, chunksize=batch_size, **kwargs) as reader:
+            for df in reader:
+                if columns is not None:
+                    df = df.reindex(columns=columns)
+                if dtype is not None:
+                    df = df.astype(dtype)
+                yield df
+
+    yield from _report_throughput(batches(), filepath)
+
+def iter_parquet(filepath, batch_size=100_000, columns=None, dtype=None):
+    """
+    Streams a Parquet file one row group at a time as DataFrame batches.
+
+    Args:
+        filepath: path to the Parquet file
+        batch_size: maximum number of rows per yielded DataFrame
+        columns: optional list of columns to read, other column chunks are skipped on disk
+        dtype: optional dtype or {column: dtype} hints applied to each batch
+
+    Yields:
+        pandas DataFrames
+    """
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(filepath):
+        print(f"Error: file not found at {filepath}")
+        return
+
+    def batches():
+        parquet_file = pq.ParquetFile(filepath)
+        for i in range(parquet_file.num_row_groups):
+            row_group = parquet_file.read_row_group(i, columns=columns)
+            for record_batch in row_group.to_batches(max_chunksize=batch_size):
+                df = record_batch.to_pandas()
+                if dtype is not None:
+                    df = df.astype(dtype)
+                yield df
+
+    yield from _report_throughput(batches(), filepath)
+
+SHARD_INDEX_FILE = "index.json"
+
+def write_numpy_shards(array, directory, rows_per_shard=1_000_000):
+    """
+    Writes an array as a directory of .npy shards plus a JSON index.
+
+    Args:
+        array: numpy array (or memory-mapped array) to shard along the first axis
+        directory: output directory, created if missing
+        rows_per_shard: number of rows in every shard except the last
+
+    Returns:
+        The index dictionary that was written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    shards = []
+    for offset in range(0, len(array), rows_per_shard):
+        part = array[offset:offset + rows_per_shard]
+        filename = f"shard-{len(shards):05d}.npy"
+        np.save(os.path.join(directory, filename), part)
+        shards.append({"file": filename, "offset": offset, "rows": len(part)})
+
+    index = {
+        "dtype": np.dtype(array.dtype).str,
+        "shape": list(array.shape),
+        "rows_per_shard": rows_per_shard,
+        "shards": shards,
+    }
+    with open(os.path.join(directory, SHARD_INDEX_FILE), "w") as f:
+        json.dump(index, f, indent=2)
+    print(f"Wrote {len(shards)} shards for array of shape {array.shape} to {directory}")
+    return index
+
+class ShardedArray:
+    """
+    Read-only, memory-mapped view over a directory written by write_numpy_shards.
+
+    Rows are located with one division, so random row access is O(1). Every
+    shard is opened with mmap_mode='r', so reads come from the shared page
+    cache and nothing is copied unless a slice spans several shards.
+    """
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, SHARD_INDEX_FILE)) as f:
+            self.index = json.load(f)
+        self.directory = directory
+        self.dtype = np.dtype(self.index["dtype"])
+        self.shape = tuple(self.index["shape"])
+        self.rows_per_shard = self.index["rows_per_shard"]
+        self._shards = [None] * len(self.index["shards"])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def _shard(self, i):
+        if self._shards[i] is None:
+            path = os.path.join(self.directory, self.index["shards"][i]["file"])
+            self._shards[i] = np.load(path, mmap_mode="r")
+        return self._shards[i]
+
+    def views(self, start, stop):
+        """Returns zero-copy views, one per shard, covering rows [start, stop)."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        parts = []
+        while start < stop:
+            shard, row = divmod(start, self.rows_per_shard)
+            count = min(stop - start, self.rows_per_shard - row)
+            parts.append(self._shard(shard)[row:row + count])
+            start += count
+        return parts
+
+    def take(self, rows):
+        """Gathers arbitrary row indices, reading each shard once."""
+        rows = np.asarray(rows, dtype=np.int64)
+        rows = np.where(rows < 0, rows + len(self), rows)
+        out = np.empty((len(rows),) + self.shape[1:], dtype=self.dtype)
+        shard_ids, local = np.divmod(rows, self.rows_per_shard)
+        for shard in np.unique(shard_ids):
+            mask = shard_ids == shard
+            out[mask] = self._shard(shard)[local[mask]]
+        return out
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError(f"row {key} out of range for {len(self)} rows")
+            shard, row = divmod(key, self.rows_per_shard)
+            return self._shard(shard)[row]
+        if isinstance(key, slice) and key.step in (None, 1):
+            parts = self.views(key.start, key.stop)
+            if len(parts) == 1:
+                return parts[0]
+            if not parts:
+                return np.empty((0,) + self.shape[1:], dtype=self.dtype)
+            return np.concatenate(parts)
+        if isinstance(key, slice):
+            return self.take(np.arange(*key.indices(len(self))))
+        return self.take(key)
+
+def load_numpy_shards(directory):
+    """Opens a sharded array directory as a memory-mapped ShardedArray."""
+    try:
+        data = ShardedArray(directory)
+        print(f"Opened sharded Numpy array from {directory}, shape: {data.shape}")
+        return data
+    except FileNotFoundError:
+        print(f"Error: shard index not found in {directory}")
+        return None
+    except Exception as e:
+        print(f"Error Loading sharded Numpy array: {e}")
+        return None
+
+def _content_hash(filepath, block_size=8 * 1024 * 1024):
+    """Returns the blake2b hex digest of a file, read in fixed-size blocks."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(filepath, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _read_meta(meta_path):
+    """Returns a cache entry's metadata, or None if it is missing or unreadable (a cache miss)."""
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        return meta if all(field in meta for field in ("size", "mtime_ns", "content_hash")) else None
+    except (OSError, ValueError):
+        return None
+
+def _write_meta(meta_path, meta):
+    """Writes a cache entry's metadata through a temporary file, so a crash never leaves it torn."""
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+def _evict_cache(cache_dir, max_cache_bytes):
+    """Deletes least recently used cache entries until the cache fits max_cache_bytes."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".json"):
+            continue
+        meta_path = os.path.join(cache_dir, name)
+        data_path = meta_path[:-len(".json")] + ".arrow"
+        try:
+            with open(meta_path) as f:
+                last_access = json.load(f)["last_access"]
+            entries.append((last_access, os.path.getsize(data_path), meta_path, data_path))
+        except (OSError, ValueError, KeyError):
+            continue
+
+    total = sum(entry[1] for entry in entries)
+    for _, size, meta_path, data_path in sorted(entries):
+        if total <= max_cache_bytes:
+            break
+        for path in (meta_path, data_path):
+            if os.path.exists(path):
+                os.remove(path)
+        total -= size
+        print(f"Evicted {data_path} from cache")
+
+def cached_load(filepath, loader=load_csv, cache_dir=".data_cache", max_cache_bytes=20 * 1024**3, **kwargs):
+    """
+    Loads a file through a columnar Arrow IPC cache.
+
+    The first load parses the source with loader and writes a typed Arrow copy.
+    Later loads memory-map that copy instead of parsing text again. An entry is
+    reused while the source size and mtime are unchanged; if only the mtime
+    moved, the content hash decides. The cache is capped at max_cache_bytes,
+    evicting least recently used entries.
+
+    Args:
+        filepath: source file path
+        loader: function used on a cache miss, e.g. load_csv or load_json
+        cache_dir: directory holding the .arrow copies and their metadata
+        max_cache_bytes: LRU size cap for the cache directory
+        **kwargs: passed to loader, and part of the cache key
+
+    Returns:
+        pandas DataFrame, or None if the source could not be loaded.
+    """
+    import pyarrow as pa
+
+    if not os.path.exists(filepath):
+        print(f"Error: File not found at {filepath}")
+        return None
+
+    os.makedirs(cache_dir, exist_ok=True)
+    source = os.path.abspath(filepath)
+    key_material = json.dumps([source, loader.__name__, kwargs], sort_keys=True, default=str)
+    key = hashlib.blake2b(key_material.encode(), digest_size=16).hexdigest()
+    meta_path = os.path.join(cache_dir, f"{key}.json")
+    data_path = os.path.join(cache_dir, f"{key}.arrow")
+    stat = os.stat(filepath)
+
+    meta = _read_meta(meta_path) if os.path.exists(data_path) else None
+    if meta is not None:
+        if meta["size"] != stat.st_size:
+            meta = None
+        elif meta["mtime_ns"] != stat.st_mtime_ns:
+            if meta["content_hash"] == _content_hash(filepath):
+                meta["mtime_ns"] = stat.st_mtime_ns
+            else:
+                meta = None
+
+    if meta is not None:
+        with pa.memory_map(data_path, "r") as source_map:
+            df = pa.ipc.open_file(source_map).read_all().to_pandas()
+        meta["last_access"] = time.time()
+        _write_meta(meta_path, meta)
+        print(f"Loaded {len(df)} rows from cache for {filepath}")
+        return df
+
+    df = loader(filepath, **kwargs)
+    if df is None:
+        return None
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    tmp_path = data_path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, data_path)
+
+    meta = {
+        "source": source,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "content_hash": _content_hash(filepath),
+        "last_access": time.time(),
+    }
+    _write_meta(meta_path, meta)
+    _evict_cache(cache_dir, max_cache_bytes)
+    return df
+
+LOADERS_BY_EXTENSION = {
+    ".csv": "csv",
+    ".json": "json",
+    ".jsonl": "jsonl",
+    ".parquet": "parquet",
+    ".npy": "npy",
+}
+
+def _file_format(filepath):
+    return LOADERS_BY_EXTENSION.get(os.path.splitext(filepath)[1].lower())
+
+def _read_any(filepath, kwargs):
+    """Reads one file based on its extension. Errors are raised, not printed, so the pool can collect them."""
+    file_format = _file_format(filepath)
+    if file_format == "csv":
+        return pd.read_csv(filepath, **kwargs)
+    if file_format == "json":
+        try:
+            return pd.read_json(filepath, **kwargs)
+        except ValueError:
+            # .json is also commonly used for JSON lines
+            return pd.read_json(filepath, lines=True, **kwargs)
+    if file_format == "jsonl":
+        return pd.read_json(filepath, lines=True, **kwargs)
+    if file_format == "parquet":
+        return pd.read_parquet(filepath, **kwargs)
+    if file_format == "npy":
+        kwargs = dict(kwargs)
+        columns = kwargs.pop("columns", None)
+        return pd.DataFrame(np.load(filepath, **kwargs), columns=columns)
+    raise ValueError(f"Unsupported file format: {filepath}")
+
+def _resolve_paths(source):
+    """Expands a directory, glob pattern or list of paths into a sorted list of supported files."""
+    if isinstance(source, (list, tuple)):
+        return list(source)
+    if os.path.isdir(source):
+        source = os.path.join(source, "**", "*")
+    paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths
+                  if os.path.isfile(p) and os.path.splitext(p)[1].lower() in LOADERS_BY_EXTENSION)
+
+def reconcile_schemas(frames, schema=None):
+    """
+    Aligns DataFrames to one schema before they are concatenated.
+
+    Args:
+        frames: list of pandas DataFrames
+        schema: optional {column: dtype}; defaults to the union of columns in first-seen order
+
+    Returns:
+        List of DataFrames that all have the same columns, missing columns filled with NaN.
+    """
+    if schema is None:
+        columns = list(dict.fromkeys(col for df in frames for col in df.columns))
+    else:
+        columns = list(schema)
+
+    aligned = []
+    for df in frames:
+        df = df.reindex(columns=columns)
+        if schema is not None:
+            df = df.astype(schema)
+        aligned.append(df)
+    return aligned
+
+def load_many(source, ordered=True, max_workers=None, schema=None, reader_kwargs=None, **kwargs):
+    """
+    Loads many files in parallel on a process pool and merges them into one DataFrame.
+
+    Args:
+        source: directory, glob pattern (e.g. "raw/part-*.csv") or list of file paths.
+                csv, json/jsonl, parquet and npy files may be mixed.
+        ordered: if True, rows follow the sorted file order; if False, files are
+                 merged as soon as they finish
+        max_workers: size of the process pool, defaults to the number of CPUs
+        schema: optional {column: dtype} every file is aligned and cast to
+        reader_kwargs: optional {format: kwargs} per reader, formats being
+                       "csv", "json", "jsonl", "parquet" and "npy"; npy files
+                       take {"columns": [...]} to name their columns
+        **kwargs: passed to the reader when every file has the same format;
+                  use reader_kwargs for mixed formats
+
+    Raises:
+        ValueError: for **kwargs with mixed formats, or npy files without
+            column names mixed with other formats.
+
+    Returns:
+        Tuple of (DataFrame or None, failures) where failures is a list of
+        {"path": ..., "error": ...} for every file that could not be read.
+    """
+    paths = _resolve_paths(source)
+    if not paths:
+        print(f"Error: no supported files found for {source}")
+        return None, []
+
+    formats = {_file_format(path) for path in paths}
+    reader_kwargs = dict(reader_kwargs or {})
+    if kwargs:
+        if len(formats) > 1:
+            raise ValueError(f"Reader options {sorted(kwargs)} are ambiguous for mixed formats "
+                             f"{sorted(formats)}, pass reader_kwargs={{format: {{...}}}} instead")
+        (file_format,) = formats
+        reader_kwargs[file_format] = {**reader_kwargs.get(file_format, {}), **kwargs}
+    if "npy" in formats and len(formats) > 1 and "columns" not in reader_kwargs.get("npy", {}):
+        raise ValueError("npy files have only integer column labels and cannot be merged with named columns, "
+                         "pass reader_kwargs={'npy': {'columns': [...]}}")
+
+    start = time.perf_counter()
+    frames = [None] * len(paths)
+    failures = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_read_any, path, reader_kwargs.get(_file_format(path), {})): i
+                   for i, path in enumerate(paths)}
+        for n, future in enumerate(as_completed(futures)):
+            i = futures[future]
+            try:
+                df = future.result()
+            except Exception as e:
+                failures.append({"path": paths[i], "error": repr(e)})
+                continue
+            frames[i if ordered else n] = df
+
+    frames = [df for df in frames if df is not None]
+    if not frames:
+        print(f"Error: all {len(paths)} files failed to load")
+        return None, failures
+
+    df = pd.concat(reconcile_schemas(frames, schema), ignore_index=True)
+    elapsed = time.perf_counter() - start
+    print(f"Loaded {len(df)} rows from {len(frames)} files in {elapsed:.2f}s "
+          f"({len(failures)} failed)")
+    return df, failures
+
+if __name__ == "__main__":
+    # example usage
+    csv_df = load_csv("data.csv")
+    json_df =  load_json("data.json")
+    json_lines_df = load_json("data_lines.json")
+    parquet_df = load_parquet("data.parquet")
+    numpy_array = load_numpy("data.npy")
+
+    if csv_df is not None:
+        print(csv_df.head())
+
+    if json_df is not None:
+        print(json_df.head())
+
+    if parquet_df is not None:
+        print(parquet_df.head())
+
+    if numpy_array is not None:
+        print(numpy_array[5])
 
-if csv_df is not None:
-    print(csv_df.head())
+    # example usage, streaming
+    for batch in iter_csv("data.csv", batch_size=50_000):
+        print(f"CSV batch: {len(batch)} rows")
 
-if json_df is not None:
-    print(json_df.head())
+    for batch in iter_jsonl("data_lines.json", batch_size=50_000):
+        print(f"JSON lines batch: {len(batch)} rows")
 
-if parquet_df is not None:
-    print(parquet_df.head())
+    # example usage, memory-mapped and sharded numpy
+    mapped_array = load_numpy("data.npy", mmap_mode="r")
+    if mapped_array is not None:
+        write_numpy_shards(mapped_array, "data_shards", rows_per_shard=100_000)
+        sharded_array = load_numpy_shards("data_shards")
+        if sharded_array is not None:
+            print(sharded_array[5], sharded_array[10:20].shape)
 
-if numpy_array is not None:
-    print(numpy_array[5])
+    # example usage, columnar cache
+    cached_df = cached_load("data.csv")
+    cached_df = cached_load("data_lines.json", loader=load_json, Lines=True)
 
+    # example usage, parallel multi-file ingestion
+    parts_df, failures = load_many("raw/part-*.csv", ordered=True)
+    for failure in failures:
+        print(f"Failed to load {failure['path']}: {failure['error']}")
@@ -1,52 +1,330 @@
 from google.cloud import aiplatform
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlparse
 
 #project location details
 PROJECT_ID ="my project id"
 REGION ="my region"
 ENDPOINT_ID = "my endpoint" #ID of deployed models endpoint
 
-def predict_custom_trained_model(project: str, 
-                                 location: str, 
-                                 endpoint: str, 
-                                 instance: list):
-    """Make prediction request to deployed model"""
+class RetryableError(Exception):
+    """Raised by a transport for failures worth retrying (throttling, 5xx, dropped connections)."""
+
+class VertexTransport:
+    """Sends instances to a Vertex AI Endpoint; the Endpoint and its gRPC channel are created once and reused."""
+
+    def __init__(self, project, location, endpoint_id):
+        aiplatform.init(project=project, location=location)
+        self.endpoint = aiplatform.Endpoint(endpoint_id)
+
+    def __call__(self, instances):
+        from google.api_core import exceptions
+        try:
+            return list(self.endpoint.predict(instances=instances).predictions)
+        except (exceptions.TooManyRequests, exceptions.ServiceUnavailable,
+                exceptions.InternalServerError, exceptions.DeadlineExceeded) as e:
+            raise RetryableError(str(e)) from e
+
+class HttpTransport:
+    """
+    Sends instances as {"instances": [...]} JSON to an HTTP prediction route.
+
+    Each worker thread keeps its own keep-alive connection, so the pool of
+    connections is as large as the client's concurrency. Useful against a
+    local stand-in such as custom_prediction_routine.py.
+    """
+
+    def __init__(self, url, timeout=30):
+        parsed = urlparse(url)
+        self.host, self.port, self.path = parsed.hostname, parsed.port or 80, parsed.path or "/predict"
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def __call__(self, instances):
+        body = json.dumps({"instances": instances})
+        try:
+            connection = self._connection()
+            connection.request("POST", self.path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            payload = response.read()
+        except (ConnectionError, http.client.HTTPException, OSError) as e:
+            self._local.connection = None
+            raise RetryableError(str(e)) from e
+        if response.status == 429 or response.status >= 500:
+            raise RetryableError(f"HTTP {response.status}: {payload[:200]!r}")
+        if response.status != 200:
+            raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+        return json.loads(payload)["predictions"]
+
+class PredictionClient:
+    """
+    Reusable, concurrent prediction client.
+
+    Large instance lists are split into chunks of at most max_instances_per_request,
+    sent concurrently on a persistent thread pool, retried with exponential
+    backoff and jitter on retryable errors, and reassembled in input order.
+    """
+
+    def __init__(self, transport, max_instances_per_request=100, max_concurrency=8,
+                 max_retries=5, initial_backoff=0.5, max_backoff=30.0):
+        self.transport = transport
+        self.max_instances_per_request = max_instances_per_request
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    @classmethod
+    def for_endpoint(cls, project, location, endpoint_id, **kwargs):
+        return cls(VertexTransport(project, location, endpoint_id), **kwargs)
+
+    @classmethod
+    def for_url(cls, url, **kwargs):
+        return cls(HttpTransport(url), **kwargs)
+
+    def _send_with_retry(self, chunk):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.transport(chunk)
+            except RetryableError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.initial_backoff * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.0)
+                print(f"Prediction request failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def predict(self, instances):
+        """Returns one prediction per instance, in the order of instances."""
+        size = self.max_instances_per_request
+        chunks = [instances[i:i + size] for i in range(0, len(instances), size)]
+        predictions = []
+        for chunk_predictions in self._executor.map(self._send_with_retry, chunks):
+            predictions.extend(chunk_predictions)
+        return predictions
+
+    def close(self):
+        self._executor.shutdown(wait=True)
 
-aiplatform.int(project=project, location=location)    
+class PredictionCache:
+    """
+    Thread-safe LRU + TTL cache of predictions keyed by instance content and model version.
 
-endpoint = aiplatform.Endpoint(endpoint)
+    Instances are canonicalized (sorted keys, compact separators) before
+    hashing, so equal feature dicts share an entry regardless of key order.
+    The model version is part of every key, so deploying a new model version
+    naturally stops serving old entries, which then age out through LRU/TTL.
+    """
 
-prediction = endpoint.predict(instances=instances)
+    def __init__(self, max_entries=100_000, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
 
-print(prediction)
-return prediction
+    @staticmethod
+    def key(instance, model_version):
+        canonical = json.dumps(instance, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.blake2b(f"{model_version}\x00{canonical}".encode(), digest_size=16).hexdigest()
 
-#Example of prediction request
+    def get(self, key):
+        """Returns (True, prediction) on a fresh hit, (False, None) otherwise."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < now:
+                del self._entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
 
-instance = [
-    {"feature1": 1.0, "feature2": 2.5, "feature3": "example_string"},
-    {"feature1": 0.5, "feature2": 3.0, "feature3": "another_string"},
-]
+    def put(self, key, prediction):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, prediction)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
 
-predict_custom_trained_model(
-    project=PROJECT_ID,
-    location=REGION,
-    endpoint=ENDPOINT_ID,
-    instances=Instances,    
-)
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+class CachedPredictionClient:
+    """
+    PredictionClient wrapper that answers repeated instances from a PredictionCache.
+
+    A fully cached request never touches the network. For a partial hit only
+    the distinct missing instances are sent, and the answers are merged back
+    in input order. model_version is a string, or a callable (such as a
+    DeployedModelVersion) resolved once per predict call so a redeploy
+    changes the keys.
+    """
+
+    def __init__(self, client, model_version, cache=None):
+        self.client = client
+        self.model_version = model_version
+        self.cache = cache or PredictionCache()
+
+    def predict(self, instances):
+        model_version = self.model_version() if callable(self.model_version) else self.model_version
+        results = [None] * len(instances)
+        missing = OrderedDict()
+        for i, instance in enumerate(instances):
+            key = self.cache.key(instance, model_version)
+            hit, prediction = self.cache.get(key)
+            if hit:
+                results[i] = prediction
+            else:
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            to_send = [instances[positions[0]] for positions in missing.values()]
+            for (key, positions), prediction in zip(missing.items(), self.client.predict(to_send)):
+                self.cache.put(key, prediction)
+                for i in positions:
+                    results[i] = prediction
+        return results
+
+def deployed_model_version(endpoint):
+    """Identifies what an Endpoint currently serves, for use as a cache key version."""
+    return ",".join(sorted(f"{m.id}@{m.model_version_id}" for m in endpoint.list_models()))
+
+class DeployedModelVersion:
+    """
+    Callable returning the last known deployed_model_version(endpoint).
+
+    Used as a CachedPredictionClient model_version. The version is resolved
+    once on the first call; after that a daemon thread re-resolves it every
+    refresh_seconds, so calls never wait on list_models() and entries cached
+    before a redeploy stop matching within refresh_seconds. A failed refresh
+    keeps the last known version.
+    """
+
+    def __init__(self, endpoint, refresh_seconds=10):
+        self.endpoint = endpoint
+        self.refresh_seconds = refresh_seconds
+        self._version = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __call__(self):
+        if self._version is None:
+            with self._lock:
+                if self._version is None:
+                    self._version = deployed_model_version(self.endpoint)
+                    self._thread = threading.Thread(target=self._refresh, daemon=True)
+                    self._thread.start()
+        return self._version
+
+    def _refresh(self):
+        while not self._stopped.wait(self.refresh_seconds):
+            try:
+                self._version = deployed_model_version(self.endpoint)
+            except Exception as e:
+                print(f"Could not refresh deployed model version: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+_clients = {}
+
+def get_prediction_client(project: str, location: str, endpoint: str, cache=None, **kwargs):
+    """
+    Returns a reused client for an endpoint, so the endpoint handle is only built once.
+
+    With a PredictionCache the client is a CachedPredictionClient over the
+    shared client, keyed by the models currently deployed on the endpoint.
+    """
+    key = (project, location, endpoint)
+    if key not in _clients:
+        client = PredictionClient.for_endpoint(project, location, endpoint, **kwargs)
+        _clients[key] = (client, DeployedModelVersion(client.transport.endpoint))
+    client, model_version = _clients[key]
+    if cache is None:
+        return client
+    return CachedPredictionClient(client, model_version, cache)
+
+def predict_custom_trained_model(project: str,
+                                 location: str,
+                                 endpoint: str,
+                                 instances: list,
+                                 cache: PredictionCache = None):
+    """Make prediction request to deployed model"""
+    prediction = get_prediction_client(project, location, endpoint, cache=cache).predict(instances)
+    print(prediction)
+    return prediction
 
 #Example to retreive endpoint information
-def get_endpoint(project: str, 
+def get_endpoint(project: str,
                  location: str,
                  endpoint_id:str):
     """Retreive and endpoint"""
+    aiplatform.init(project=project, location=location)
+    endpoint = aiplatform.Endpoint(endpoint_id)
+    return endpoint
 
-aiplatform.init(project=project, location=location)
+if __name__ == "__main__":
+    #Example of prediction request
+    instances = [
+        {"feature1": 1.0, "feature2": 2.5, "feature3": "example_string"},
+        {"feature1": 0.5, "feature2": 3.0, "feature3": "another_string"},
+    ]
 
-endpoint = aiplatform.Endpoint(endpoint_id)
+    predict_custom_trained_model(
+        project=PROJECT_ID,
+        location=REGION,
+        endpoint=ENDPOINT_ID,
+        instances=instances,
+    )
 
-return endpoint
+    get_endpoint(project=PROJECT_ID,
+                 location=REGION,
+                 endpoint_id=ENDPOINT_ID)
 
-get_endpoint(project=PROJECT_ID, 
-             location=REGION, 
-             endpoint_id=ENDPOINT_ID)
+    #Example of a concurrent client against a local stand-in (e.g. custom_prediction_routine.py)
+    local_client = PredictionClient.for_url("http://127.0.0.1:8080/predict", max_instances_per_request=64)
+    local_predictions = local_client.predict([[0.0] * 128 for _ in range(1000)])
+    print(f"Received {len(local_predictions)} predictions")
+    local_client.close()
 
+    #Example of a prediction cache, repeated instances are answered without a request
+    prediction_cache = PredictionCache(max_entries=10_000, ttl_seconds=60)
+    for _ in range(3):
+        predict_custom_trained_model(
+            project=PROJECT_ID,
+            location=REGION,
+            endpoint=ENDPOINT_ID,
+            instances=instances,
+            cache=prediction_cache,
+        )
+    print(prediction_cache.stats())
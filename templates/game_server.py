@@ -1,7 +1,19 @@
 from google.cloud import aiplatform, container_v1, agones_v1, storage
+import atexit
+import gzip
+import io
+import json
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
 import time
 import uuid
 
+from endpoints import PredictionCache
+
 # --- Configuration ---
 PROJECT_ID = "project-id"
 REGION = "region" 
@@ -50,7 +62,7 @@ def create_game_server(model_resource_name):
                     "containers": [{
                         "name": "game-server",
                         "image": "game-server-image",
-                        "ports": [{"containerPort": 7654}]
+                        "ports": [{"containerPort": 7654}],
                         "env": [
                             {"name": "MODEL_RESOURCE_NAME", "value": model_resource_name},
                             {"name": "BUCKET_NAME", "value": BUCKET_NAME}
@@ -74,32 +86,394 @@ def get_game_server_address(game_server_name):
     return game_server.status.address, game_server.status.ports[0].port
 
 # --- AI Adaptive Behavior Logic (A splash of) ---
-def process_game_state(game_state, model_resource_name):
-    # store the game state in cloud storage
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(BUCKET_NAME)
-    blob = bucket.blob(f"game_state/{uuid.uuid4()}.json")
-    blob.upload_from_string(game_state)
-
-    # make prediction using the vertex ai model
-    aiplatform_client = aiplatform.gapit.PredictionServiceClient(client_options={"api_endpoint": f"{REGION}-aiplatform.googleapis.com"})
-    endpoint = aiplatform_client.endpoint_path(
-        project=PROJECT_ID, location=REGION, endpoint=model_resource_name.split('/models/')[0].replace('models', 'endpoints')
-    )
-    instance = {"content": game_state}
-    prediction_request = {"endpoint": endpoint, "instances": [instance]}
-    response = aiplatform_client_predict(request=prediction_request)
+# identical game states (and retried ticks) reuse the last prediction for the same model
+prediction_cache = PredictionCache(max_entries=50_000, ttl_seconds=30)
 
-    # adapt game behavior based on prediction
-    prediction = response.predictions[0]
+# --- Game state archival ---
+class LocalStorageBackend:
+    """Stores archive objects as files under root; writes are atomic (temp file + rename)."""
 
-    # implement game logic that uses the prediction to modify game parameters
-    adapted_behavior = prediction
+    def __init__(self, root):
+        self.root = root
+
+    def write_bytes(self, name, data):
+        path = os.path.join(self.root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+
+    def read_bytes(self, name):
+        with open(os.path.join(self.root, name), "rb") as f:
+            return f.read()
+
+    def list_names(self, prefix):
+        base = os.path.join(self.root, prefix)
+        names = []
+        for directory, _, files in os.walk(base):
+            for filename in files:
+                if not filename.endswith(".tmp"):
+                    names.append(os.path.relpath(os.path.join(directory, filename), self.root).replace(os.sep, "/"))
+        return sorted(names)
+
+class GCSStorageBackend:
+    """Stores archive objects as blobs in a Cloud Storage bucket."""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+
+    def write_bytes(self, name, data):
+        self.bucket.blob(name).upload_from_string(data)
+
+    def read_bytes(self, name):
+        return self.bucket.blob(name).download_as_bytes()
+
+    def list_names(self, prefix):
+        return sorted(blob.name for blob in self.bucket.list_blobs(prefix=prefix))
+
+class ArchiveWriter:
+    """
+    Buffers game states and writes them as compressed segments.
+
+    States are buffered in memory and written as one gzip JSON lines (or
+    zstd Parquet) segment when the buffer reaches max_segment_bytes of raw
+    JSON or its oldest state is max_segment_age seconds old. JSON lines hold
+    one compact JSON value per state (non-JSON states as JSON strings); a
+    buffer that cannot be written as Parquet falls back to JSON lines so one
+    odd state never stalls the archive. After each
+    segment the writer rewrites its own index file (segment name, record
+    count, bytes, time range), so readers never list segments directly and
+    several servers can archive to one prefix. close() is registered with
+    atexit until it is called, so buffered states are flushed on a normal
+    shutdown; see install_shutdown_flush for SIGTERM.
+    """
+
+    FORMATS = {"jsonl.gz": "jsonl.gz", "parquet": "parquet"}
+
+    def __init__(self, backend, prefix="game_state", segment_format="jsonl.gz",
+                 max_segment_bytes=64 * 1024 * 1024, max_segment_age=300.0, writer_id=None):
+        if segment_format not in self.FORMATS:
+            raise ValueError(f"Unsupported segment format: {segment_format}")
+        self.backend = backend
+        self.prefix = prefix
+        self.segment_format = segment_format
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.writer_id = writer_id or f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+        self.index = []
+        self._buffer = []
+        self._buffer_bytes = 0
+        self._opened_at = None
+        self._first_ts = None
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def append_many(self, states):
+        with self._lock:
+            now = time.time()
+            if not self._buffer:
+                self._opened_at, self._first_ts = time.monotonic(), now
+            self._buffer.extend(states)
+            self._buffer_bytes += sum(len(state) + 1 for state in states)
+            full = self._buffer_bytes >= self.max_segment_bytes
+        if full:
+            self.flush()
+
+    def append(self, state):
+        self.append_many([state])
+
+    def roll_if_due(self):
+        """Flushes the current segment if it has reached max_segment_age."""
+        if self._buffer and time.monotonic() - self._opened_at >= self.max_segment_age:
+            self.flush()
+
+    @staticmethod
+    def _jsonl_record(state):
+        try:
+            return json.dumps(json.loads(state), separators=(",", ":"))
+        except ValueError:
+            return json.dumps(state)  # game states are not required to be JSON
+
+    def _encode(self, states):
+        """Returns (segment bytes, format), falling back to jsonl.gz when Parquet cannot hold the states."""
+        if self.segment_format == "parquet":
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            sink = io.BytesIO()
+            try:
+                rows = [json.loads(state) for state in states]
+                pq.write_table(pa.Table.from_pylist(rows), sink, compression="zstd")
+                return sink.getvalue(), "parquet"
+            except (ValueError, TypeError, AttributeError, pa.ArrowException) as e:
+                print(f"Game states do not fit a Parquet segment ({e}), writing JSON lines instead")
+        records = "\n".join(self._jsonl_record(state) for state in states)
+        return gzip.compress(records.encode() + b"\n"), "jsonl.gz"
+
+    def flush(self):
+        """Writes the buffered states as one segment and updates the index."""
+        with self._lock:
+            if not self._buffer:
+                return
+            states = self._buffer
+            data, segment_format = self._encode(states)
+            name = f"{self.prefix}/segments/{self.writer_id}-{len(self.index):06d}.{self.FORMATS[segment_format]}"
+            self.backend.write_bytes(name, data)
+
+            self.index.append({
+                "segment": name,
+                "format": segment_format,
+                "records": len(states),
+                "raw_bytes": self._buffer_bytes,
+                "bytes": len(data),
+                "first_ts": self._first_ts,
+                "last_ts": time.time(),
+            })
+            index_data = "\n".join(json.dumps(entry) for entry in self.index).encode()
+            self.backend.write_bytes(f"{self.prefix}/index/{self.writer_id}.jsonl", index_data)
+            self._buffer, self._buffer_bytes = [], 0
+
+    def close(self):
+        atexit.unregister(self.close)
+        self.flush()
+
+def iter_archive(backend, prefix="game_state"):
+    """Reads every archived game state back as a dict (raw text for non-JSON states), segment by segment, via the index files."""
+    for index_name in backend.list_names(f"{prefix}/index/"):
+        for line in backend.read_bytes(index_name).decode().splitlines():
+            entry = json.loads(line)
+            data = backend.read_bytes(entry["segment"])
+            if entry["format"] == "parquet":
+                import pyarrow.parquet as pq
+                yield from pq.read_table(io.BytesIO(data)).to_pylist()
+            else:
+                for record in gzip.decompress(data).decode().splitlines():
+                    yield json.loads(record)
+
+def install_shutdown_flush():
+    """Turns SIGTERM (sent by Agones/Kubernetes on shutdown) into a normal exit so atexit flushes run."""
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+class BackgroundUploader:
+    """
+    Fire-and-forget archiver for game states.
+
+    put() only appends to a bounded queue and never blocks the game loop; if
+    the queue is full the state is dropped and counted. A daemon thread
+    drains the queue in batches into an ArchiveWriter, which rolls segments
+    over by size and age. The default writer archives to BUCKET_NAME.
+    close() is registered with atexit, so queued states are drained on
+    shutdown, for at most its timeout.
+    """
 
+    def __init__(self, writer=None, max_queue=10_000, batch_size=500, flush_interval=5.0):
+        self.writer = writer
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.archived = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def put(self, game_state):
+        try:
+            self._queue.put_nowait(game_state)
+        except queue.Full:
+            self.dropped += 1
+
+    def _write(self, batch):
+        if self.writer is None:
+            self.writer = ArchiveWriter(GCSStorageBackend(storage.Client().bucket(BUCKET_NAME)))
+        try:
+            if batch:
+                self.writer.append_many(batch)
+                self.archived += len(batch)
+            self.writer.roll_if_due()
+        except Exception as e:
+            # the writer keeps its buffer, so the next flush retries these states
+            print(f"Game state archiving failed: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._write([])
+                continue
+            batch = []
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write(batch)
+            if item is None:
+                return
+
+    def close(self, timeout=10.0):
+        """Drains queued states, flushes the open segment and stops the thread, waiting at most timeout seconds."""
+        if self._closed:
+            return
+        self._closed = True
+        atexit.unregister(self.close)
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(max(0.0, deadline - time.monotonic()))
+        if self._thread.is_alive():
+            print(f"Game state uploader did not drain within {timeout}s, {self._queue.qsize()} states not archived")
+        if self.writer is not None:
+            self.writer.close()
+
+def _cache_instance(game_state):
+    """JSON states are keyed by content, so key order does not matter; any other state by its raw text."""
+    try:
+        return ["json", json.loads(game_state)]
+    except (TypeError, ValueError):
+        return ["raw", game_state]
+
+class InferenceSession:
+    """
+    Persistent per-server inference state for the game loop.
+
+    The prediction client, endpoint path and uploader are created once and
+    reused on every tick. Archiving is handed to a BackgroundUploader, so a
+    tick costs at most one prediction round trip (none on a cache hit). With
+    a local_model the session can answer in-process: always, when no
+    latency_budget_ms is set, or as a fallback when the remote call misses
+    its budget or fails.
+    """
+
+    def __init__(self, model_resource_name, prediction_client=None, uploader=None, cache=prediction_cache,
+                 local_model=None, latency_budget_ms=None):
+        self.model_resource_name = model_resource_name
+        self.cache = cache
+        self.local_model = local_model
+        self.latency_budget_ms = latency_budget_ms
+        self.uploader = uploader or BackgroundUploader()
+        self.client = prediction_client or aiplatform.gapic.PredictionServiceClient(
+            client_options={"api_endpoint": f"{REGION}-aiplatform.googleapis.com"})
+        self.endpoint = self.client.endpoint_path(
+            project=PROJECT_ID, location=REGION, endpoint=model_resource_name.split('/models/')[0].replace('models', 'endpoints')
+        )
+        self.local_fallbacks = 0
+
+    def _remote_predict(self, game_state):
+        prediction_request = {"endpoint": self.endpoint, "instances": [{"content": game_state}]}
+        if self.latency_budget_ms is None:
+            response = self.client.predict(request=prediction_request)
+        else:
+            response = self.client.predict(request=prediction_request, timeout=self.latency_budget_ms / 1000)
+        return response.predictions[0]
+
+    def predict(self, game_state):
+        self.uploader.put(game_state)
+
+        cache_key = self.cache.key(_cache_instance(game_state), self.model_resource_name)
+        hit, adapted_behavior = self.cache.get(cache_key)
+        if hit:
+            return adapted_behavior
+
+        if self.local_model is not None and self.latency_budget_ms is None:
+            adapted_behavior = self.local_model(game_state)
+        else:
+            try:
+                adapted_behavior = self._remote_predict(game_state)
+            except Exception:
+                if self.local_model is None:
+                    raise
+                self.local_fallbacks += 1
+                adapted_behavior = self.local_model(game_state)
+
+        self.cache.put(cache_key, adapted_behavior)
+        return adapted_behavior
+
+    def close(self):
+        self.uploader.close()
+
+_sessions = {}
+
+def get_inference_session(model_resource_name, **kwargs):
+    """Returns the session for a model, creating it on first use."""
+    if model_resource_name not in _sessions:
+        _sessions[model_resource_name] = InferenceSession(model_resource_name, **kwargs)
+    return _sessions[model_resource_name]
+
+def process_game_state(game_state, model_resource_name):
+    # archive the state in the background and predict through the persistent session
+    adapted_behavior = get_inference_session(model_resource_name).predict(game_state)
+
+    # implement game logic that uses the prediction to modify game parameters
     return adapted_behavior
 
-# --- Main ---    
+# --- Tick latency benchmark ---
+class _StubPredictionClient:
+    """Local stand-in for PredictionServiceClient with a fixed simulated round trip."""
+
+    def __init__(self, round_trip_ms=20.0):
+        self.round_trip_ms = round_trip_ms
+
+    def endpoint_path(self, project, location, endpoint):
+        return f"projects/{project}/locations/{location}/endpoints/{endpoint}"
+
+    def predict(self, request, timeout=None):
+        delay = self.round_trip_ms / 1000
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("stub deadline exceeded")
+        time.sleep(delay)
+
+        class Response:
+            predictions = [{"difficulty": 0.5}]
+        return Response()
+
+def benchmark_ticks(session, n_ticks=500, distinct_states=50):
+    """Runs n_ticks through a session and reports per-tick latency percentiles in ms."""
+    latencies = []
+    for tick in range(n_ticks):
+        game_state = json.dumps({"player_position": [tick % distinct_states, 20], "enemy_count": 5})
+        start = time.perf_counter()
+        session.predict(game_state)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    results = {
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "max_ms": latencies[-1],
+        "cache": session.cache.stats(),
+        "local_fallbacks": session.local_fallbacks,
+        "dropped_uploads": session.uploader.dropped,
+    }
+    print(f"Tick latency: p50 {results['p50_ms']:.2f} ms, p99 {results['p99_ms']:.2f} ms, max {results['max_ms']:.2f} ms")
+    return results
+
+def run_tick_benchmark():
+    """Benchmarks the session against local stubs, with and without a local fallback model."""
+    for budget, local_model in ((None, None), (5.0, lambda state: {"difficulty": 0.5})):
+        session = InferenceSession(
+            "projects/p/locations/l/models/m",
+            prediction_client=_StubPredictionClient(round_trip_ms=20.0),
+            uploader=BackgroundUploader(writer=ArchiveWriter(LocalStorageBackend(tempfile.mkdtemp()))),
+            cache=PredictionCache(max_entries=1_000, ttl_seconds=30),
+            local_model=local_model,
+            latency_budget_ms=budget,
+        )
+        print(f"latency budget: {budget} ms")
+        benchmark_ticks(session)
+        session.close()
+
+# --- Main ---
 if __name__ == "__main__":
+    install_shutdown_flush()
     model_name = train_adaptive_behavior_model()
     game_server = create_game_server(model_name)
     print(f"Game server created: {game_server.name}")
@@ -107,8 +481,8 @@ if __name__ == "__main__":
     address, port = get_game_server_address(game_server.name)
     print(f"Game server address: {address}:{port}")
 
-# simulated Game Loop
-game_state = '{"player_position": [10, 20], "enemy_count": 5}'
-adapted_behavor = process_game_state(game_state, model_name)
-print(f"Adapted behavior: {adapted_behavior}")
-#--- game loop ---
\ No newline at end of file
+    # simulated Game Loop
+    game_state = '{"player_position": [10, 20], "enemy_count": 5}'
+    adapted_behavior = process_game_state(game_state, model_name)
+    print(f"Adapted behavior: {adapted_behavior}")
+    #--- game loop ---
@@ -1,5 +1,10 @@
 import pandas as pd
 import numpy as np
+import json
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from scipy import sparse
 from sklearn .model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, OneHotEncoder
 from sklearn.compose import ColumnTransformer
@@ -7,47 +12,158 @@ from sklearn.impute import SimpleImputer
 from sklearn.pipeline import Pipeline
 
 
-def preprocess_data(df, numerical_features, categorical_features, target_column):
+DEFAULT_MAX_DENSE_BYTES = 1024**3
+
+def estimate_dense_bytes(matrix, dtype=np.float64):
+    """Returns how many bytes a dense copy of matrix would take."""
+    rows, cols = matrix.shape
+    return rows * cols * np.dtype(dtype).itemsize
+
+def _warn_if_too_dense(shape, estimate, max_dense_bytes, detail=""):
+    if estimate > max_dense_bytes:
+        warnings.warn(
+            f"Densifying a {shape} sparse matrix{detail} will allocate about {estimate / 1e9:.2f} GB",
+            RuntimeWarning,
+        )
+
+def densify(matrix, max_dense_bytes=DEFAULT_MAX_DENSE_BYTES):
+    """Converts a sparse matrix to a dense array, warning first if the result would exceed max_dense_bytes."""
+    if not sparse.issparse(matrix):
+        return matrix
+    _warn_if_too_dense(matrix.shape, estimate_dense_bytes(matrix, matrix.dtype), max_dense_bytes,
+                       f" ({matrix.nnz} non-zeros, {matrix.data.nbytes / 1e6:.1f} MB)")
+    return matrix.toarray()
+
+class HybridMatrix:
+    """
+    Dense numeric block next to a CSR one-hot block, with the same rows.
+
+    Keeps high-cardinality categorical features sparse while numeric features
+    stay as a plain array. tocsr() feeds sparse-aware sklearn estimators and
+    iter_batches()/to_dataset() feed Keras with small dense batches, so the
+    full matrix is never densified. training.train_model accepts a
+    HybridMatrix directly and converts it with to_dataset().
+    """
+
+    def __init__(self, dense, sparse_block):
+        self.dense = np.asarray(dense)
+        self.sparse = sparse.csr_matrix(sparse_block)
+        self.shape = (self.dense.shape[0], self.dense.shape[1] + self.sparse.shape[1])
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, rows):
+        """Selects rows (slice or index array) and returns a new HybridMatrix."""
+        return HybridMatrix(self.dense[rows], self.sparse[rows])
+
+    def tocsr(self):
+        return sparse.hstack([sparse.csr_matrix(self.dense), self.sparse], format="csr")
+
+    def toarray(self, max_dense_bytes=DEFAULT_MAX_DENSE_BYTES):
+        return np.hstack([self.dense, densify(self.sparse, max_dense_bytes)])
+
+    def iter_batches(self, batch_size=1024):
+        """Yields dense row batches, only batch_size rows are densified at a time."""
+        for start in range(0, len(self), batch_size):
+            batch = self[start:start + batch_size]
+            yield np.hstack([batch.dense, batch.sparse.toarray()])
+
+    def to_dataset(self, labels=None, batch_size=1024, shuffle=False, seed=None):
+        """
+        Returns a batched tf.data.Dataset of dense float32 row batches for Keras fit/evaluate/predict.
+
+        With labels the elements are (features, labels) pairs. Only one batch
+        is densified at a time; with shuffle the rows are permuted again on
+        every pass over the dataset.
+        """
+        import tensorflow as tf
+        labels = None if labels is None else np.asarray(labels)
+        rng = np.random.default_rng(seed)
+
+        def generate():
+            order = rng.permutation(len(self)) if shuffle else None
+            for start in range(0, len(self), batch_size):
+                rows = slice(start, start + batch_size) if order is None else np.sort(order[start:start + batch_size])
+                batch = self[rows]
+                features = np.hstack([batch.dense, batch.sparse.toarray()]).astype(np.float32)
+                yield features if labels is None else (features, labels[rows])
+
+        features_spec = tf.TensorSpec(shape=(None, self.shape[1]), dtype=tf.float32)
+        if labels is None:
+            signature = features_spec
+        else:
+            signature = (features_spec, tf.TensorSpec(shape=(None,) + labels.shape[1:], dtype=tf.as_dtype(labels.dtype)))
+        return tf.data.Dataset.from_generator(generate, output_signature=signature).prefetch(tf.data.AUTOTUNE)
+
+def build_preprocessor(numerical_features, categorical_features, sparse_threshold=0.3):
+    """Builds the unfitted ColumnTransformer shared by the preprocessing functions."""
+    numerical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='median')),
+        ('scaler', StandardScaler())
+    ])
+
+    categorical_transformer = Pipeline(steps=[
+        ('imputer', SimpleImputer(strategy='most_frequent')),
+        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+    ])
+
+    return ColumnTransformer(transformers=[
+        ('num', numerical_transformer, numerical_features),
+        ('cat', categorical_transformer, categorical_features)
+    ], sparse_threshold=sparse_threshold)
+
+def preprocess_data(df, numerical_features, categorical_features, target_column,
+                    output="dense", max_dense_bytes=DEFAULT_MAX_DENSE_BYTES, split_key=None):
     """
     Preprocessing data for machine learning
-    Args: 
+    Args:
         de : pandas datafrmae containing the data
         numerical_features : list of numerical column names
         categorical_features : list of categorical column names
         target_column: name of the target column
+        output: "dense" for NumPy arrays, "sparse" for CSR matrices, or
+                "hybrid" for HybridMatrix (dense numeric + CSR one-hot)
+        max_dense_bytes: warn before densifying anything larger than this
+        split_key: optional key column(s); when set, rows are split with
+                   hash_split so the split is stable as the dataset grows
     Returns:
         Tuple of (X_train, X_test, y_train, y_test)
     """
 
     y = df[target_column]
-    x = df.drop(target_column, axis=1)
+    X = df.drop(target_column, axis=1)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    numerical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='median')), 
-        ('scaler', StandardScaler())         
-    ])
-
-    categorical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='most_frequent')), 
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))         
-    ])
+    if split_key is None:
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    else:
+        splits = hash_split(df, split_key, fractions=(0.8, 0.2))
+        X_train, X_test = splits["train"].drop(target_column, axis=1), splits["test"].drop(target_column, axis=1)
+        y_train, y_test = splits["train"][target_column], splits["test"][target_column]
 
-    preprocessor = ColumnTransformer(transformers=[
-        ('num', numerical_transformer(numerical_features)), 
-        ('cat', categorical_transformer(categorical_features))         
-    ])
+    if output not in ("dense", "sparse", "hybrid"):
+        raise ValueError(f"Unsupported output mode: {output}")
 
-    X_train_processed = preprocessor.fit_transform(X_train) 
-    X_test_processed = preprocessor.transform(X_test) 
+    # a threshold of 1.0 keeps the ColumnTransformer output sparse whenever the one-hot block is
+    preprocessor = build_preprocessor(numerical_features, categorical_features,
+                                      sparse_threshold=0.3 if output == "dense" else 1.0)
 
-    # Handle cases where the output of the columnTransformer is a sparse matrix
-    if hasattr(X_train_processed, 'toarray'):
-        X_train_processed = X_train_processed.toarray()
+    X_train_processed = preprocessor.fit_transform(X_train)
+    X_test_processed = preprocessor.transform(X_test)
 
-    if hasattr(X_test_processed, 'toarray'):
-        X_test_processed = X_test_processed.toarray()
+    if output == "sparse":
+        X_train_processed = sparse.csr_matrix(X_train_processed)
+        X_test_processed = sparse.csr_matrix(X_test_processed)
+    elif output == "hybrid":
+        n_num = len(numerical_features)
+        X_train_processed = sparse.csr_matrix(X_train_processed)
+        X_test_processed = sparse.csr_matrix(X_test_processed)
+        X_train_processed = HybridMatrix(X_train_processed[:, :n_num].toarray(), X_train_processed[:, n_num:])
+        X_test_processed = HybridMatrix(X_test_processed[:, :n_num].toarray(), X_test_processed[:, n_num:])
+    else:
+        # Handle cases where the output of the columnTransformer is a sparse matrix
+        X_train_processed = densify(X_train_processed, max_dense_bytes)
+        X_test_processed = densify(X_test_processed, max_dense_bytes)
 
     return X_train_processed, X_test_processed, y_train, y_test, preprocessor
 
@@ -60,62 +176,510 @@ def preprocess_dataframe(df, numerical_features, categorical_features):
         numerical_features: list of numerical column names
         categorical_features: list of categorical column names
 
-    Returns: 
+    Returns:
         The preprocessed pandas dataframe.
 
-    """  
-    y = df[target_column]
-    x = df.drop(target_column, axis=1)
+    """
+    preprocessor = build_preprocessor(numerical_features, categorical_features)
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-    
-    numerical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='median')), 
-        ('scaler', StandardScaler())         
-    ])
+    processed_data = preprocessor.fit_transform(df)
 
-    categorical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='most_frequent')), 
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))         
-    ])
+    processed_data = densify(processed_data)
 
-    preprocessor = ColumnTransformer(transformers=[
-        ('num', numerical_transformer(numerical_features)), 
-        ('cat', categorical_transformer(categorical_features))         
-    ])
+    # create new dataframe with processed data.
+    feature_names = preprocessor.get_feature_names_out()
+    processed_df = pd.DataFrame(processed_data, columns=feature_names)
 
-    processed_data = preprocessor.fit_transform(df) 
+    return processed_df, preprocessor
 
-    if hasattr(processed_data, 'toarray'):
-        processed_data = processed_data.toarray()
+class PreprocessorArtifact:
+    """
+    Fitted imputer, scaler and one-hot state that can be saved and reapplied.
 
-    # create new dataframe with processed data.
-feature_names = preprocessor.get_feature_names_out() 
-processed_df = pd.DataFrame(preprocess_data, columns=feature_names)
+    The state is read out of a fitted ColumnTransformer once and stored as
+    plain JSON, so loading an artifact needs neither pickle nor the sklearn
+    graph. transform() applies the same math as the ColumnTransformer with
+    vectorized NumPy/pandas operations and no per-call sklearn validation,
+    which keeps batch and serving output identical to training output.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self, state):
+        self.state = state
+        self.numerical_features = state["numerical_features"]
+        self.categorical_features = state["categorical_features"]
+        self._medians = np.asarray(state["medians"], dtype=np.float64)
+        self._means = np.asarray(state["means"], dtype=np.float64)
+        self._scales = np.asarray(state["scales"], dtype=np.float64)
+        self._categories = [pd.Index(c) for c in state["categories"]]
+        self._offsets = np.cumsum([0] + [len(c) for c in state["categories"]])
+        self.n_features_out = len(self.numerical_features) + int(self._offsets[-1])
+
+    @classmethod
+    def fit(cls, df, numerical_features, categorical_features, version="1"):
+        """Fits the standard preprocessor on df and captures its state."""
+        preprocessor = build_preprocessor(numerical_features, categorical_features)
+        preprocessor.fit(df)
+        return cls.from_column_transformer(preprocessor, version=version)
+
+    @classmethod
+    def from_column_transformer(cls, preprocessor, version="1"):
+        """Captures the state of a fitted ColumnTransformer from build_preprocessor."""
+        num = preprocessor.named_transformers_["num"]
+        cat = preprocessor.named_transformers_["cat"]
+        transformers = {name: columns for name, _, columns in preprocessor.transformers_}
+        state = {
+            "format_version": cls.FORMAT_VERSION,
+            "version": version,
+            "numerical_features": list(transformers["num"]),
+            "categorical_features": list(transformers["cat"]),
+            "medians": num.named_steps["imputer"].statistics_.tolist(),
+            "means": num.named_steps["scaler"].mean_.tolist(),
+            "scales": num.named_steps["scaler"].scale_.tolist(),
+            "most_frequent": cat.named_steps["imputer"].statistics_.tolist(),
+            "categories": [c.tolist() for c in cat.named_steps["onehot"].categories_],
+            "feature_names": preprocessor.get_feature_names_out().tolist(),
+        }
+        return cls(state)
+
+    def save(self, path):
+        """Writes the artifact as compact JSON."""
+        with open(path, "w") as f:
+            json.dump(self.state, f, separators=(",", ":"))
+        print(f"Saved preprocessor artifact version {self.state['version']} to {path}")
+
+    @classmethod
+    def load(cls, path):
+        """Reads an artifact written by save()."""
+        with open(path) as f:
+            state = json.load(f)
+        if state.get("format_version") != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported preprocessor artifact format: {state.get('format_version')}")
+        return cls(state)
+
+    def transform(self, df):
+        """
+        Applies the fitted preprocessing to a DataFrame.
+
+        Returns:
+            Dense float64 NumPy array with the same columns as the fitted ColumnTransformer.
+        """
+        n_num = len(self.numerical_features)
+        out = np.zeros((len(df), self.n_features_out), dtype=np.float64)
+
+        numeric = df[self.numerical_features].to_numpy(dtype=np.float64)
+        numeric = np.where(np.isnan(numeric), self._medians, numeric)
+        np.subtract(numeric, self._means, out=numeric)
+        np.divide(numeric, self._scales, out=out[:, :n_num])
+
+        rows = np.arange(len(df))
+        for i, column in enumerate(self.categorical_features):
+            values = df[column].fillna(self.state["most_frequent"][i])
+            codes = self._categories[i].get_indexer(values)
+            known = codes >= 0  # unknown categories stay all-zero, like handle_unknown='ignore'
+            out[rows[known], n_num + self._offsets[i] + codes[known]] = 1.0
+        return out
+
+    def transform_dataframe(self, df):
+        """Same as transform() but returns a DataFrame with the fitted feature names."""
+        return pd.DataFrame(self.transform(df), columns=self.state["feature_names"], index=df.index)
+
+class QuantileSketch:
+    """
+    Mergeable, bounded-memory quantile sketch for streaming medians.
+
+    Values go into level 0; when a level holds more than size items it is
+    sorted and every other item is promoted to the next level with twice the
+    weight (a KLL-style compactor). Memory stays around size * log2(n / size)
+    floats and the rank error is on the order of log2(n / size) / size, so
+    with the default size a streamed median lands well within 1% of rank of
+    the exact one.
+    """
+
+    def __init__(self, size=2000, seed=0):
+        self.size = size
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+
+    def merge(self, other):
+        for level, items in enumerate(other.levels):
+            if level == len(self.levels):
+                self.levels.append(np.empty(0))
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self._compact()
+
+    def _compact(self):
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.size:
+                items = np.sort(self.levels[level])
+                leftover = items[len(items) - len(items) % 2:]
+                promoted = items[self._rng.integers(2):len(items) - len(leftover):2]
+                self.levels[level] = leftover
+                if level + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+            level += 1
+
+    def quantile(self, q):
+        if self.count == 0:
+            return np.nan
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, kind="stable")
+        cumulative = np.cumsum(weights[order])
+        return values[order][np.searchsorted(cumulative, q * cumulative[-1])]
+
+class StreamingPreprocessor:
+    """
+    Out-of-core counterpart of build_preprocessor that fits from DataFrame batches.
+
+    partial_fit() updates running statistics for one batch: Welford/Chan
+    mean and variance, a QuantileSketch per numeric column for the median,
+    and category counts per categorical column. finalize() turns them into a
+    PreprocessorArtifact, which then transforms further batches.
+
+    Tolerance against the in-memory ColumnTransformer: medians carry the
+    sketch error described in QuantileSketch, and means/scales are exact up
+    to how that median shifts the imputed values (exact when no values are
+    missing). Category vocabularies are exact unless max_categories or
+    min_frequency drop rare values, which are then treated as unknown.
+    """
+
+    def __init__(self, numerical_features, categorical_features, sketch_size=2000,
+                 max_categories=None, min_frequency=1):
+        self.numerical_features = list(numerical_features)
+        self.categorical_features = list(categorical_features)
+        self.max_categories = max_categories
+        self.min_frequency = min_frequency
+        n_num = len(self.numerical_features)
+        self.rows = 0
+        self.counts = np.zeros(n_num)
+        self.means = np.zeros(n_num)
+        self.m2 = np.zeros(n_num)
+        self.sketches = [QuantileSketch(sketch_size) for _ in self.numerical_features]
+        self.category_counts = [pd.Series(dtype=np.int64) for _ in self.categorical_features]
+
+    def partial_fit(self, df):
+        """Updates the running statistics with one DataFrame batch."""
+        self.rows += len(df)
+        numeric = df[self.numerical_features].to_numpy(dtype=np.float64)
+        observed = ~np.isnan(numeric)
+        batch_counts = observed.sum(axis=0)
+        batch_means = np.nansum(numeric, axis=0) / np.maximum(batch_counts, 1)
+        batch_m2 = np.nansum((numeric - batch_means) ** 2, axis=0)
+
+        # Chan et al. pairwise combination of (count, mean, M2)
+        total = self.counts + batch_counts
+        delta = batch_means - self.means
+        safe_total = np.maximum(total, 1)
+        self.means = self.means + delta * batch_counts / safe_total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.counts * batch_counts / safe_total
+        self.counts = total
+
+        for i, sketch in enumerate(self.sketches):
+            sketch.update(numeric[:, i])
+        for i, column in enumerate(self.categorical_features):
+            self.category_counts[i] = self.category_counts[i].add(df[column].value_counts(), fill_value=0)
+        return self
+
+    def finalize(self, version="1"):
+        """Builds a PreprocessorArtifact from the statistics gathered so far."""
+        medians = np.array([sketch.quantile(0.5) for sketch in self.sketches])
+
+        # the scaler sees median-imputed values, so fold the missing rows in as a constant group
+        missing = self.rows - self.counts
+        total = np.maximum(self.counts + missing, 1)
+        means = (self.counts * self.means + missing * medians) / total
+        m2 = self.m2 + (self.means - medians) ** 2 * self.counts * missing / total
+        scales = np.sqrt(m2 / total)
+        scales[scales == 0] = 1.0
+
+        most_frequent, categories = [], []
+        for counts in self.category_counts:
+            # ties broken by the smallest value, as SimpleImputer does
+            ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+            most_frequent.append(ranked[0][0] if ranked else None)
+            kept = [value for value, count in ranked if count >= self.min_frequency]
+            if self.max_categories is not None:
+                kept = kept[:self.max_categories]
+            categories.append(sorted(kept))
+
+        feature_names = [f"num__{column}" for column in self.numerical_features]
+        for column, values in zip(self.categorical_features, categories):
+            feature_names.extend(f"cat__{column}_{value}" for value in values)
+
+        return PreprocessorArtifact({
+            "format_version": PreprocessorArtifact.FORMAT_VERSION,
+            "version": version,
+            "numerical_features": self.numerical_features,
+            "categorical_features": self.categorical_features,
+            "medians": medians.tolist(),
+            "means": means.tolist(),
+            "scales": scales.tolist(),
+            "most_frequent": most_frequent,
+            "categories": categories,
+            "feature_names": feature_names,
+        })
+
+def fit_streaming(batches, numerical_features, categorical_features, version="1", **kwargs):
+    """
+    First pass: fits a PreprocessorArtifact from any iterator of DataFrames.
+
+    Args:
+        batches: iterable of pandas DataFrames, e.g. data_loading.iter_csv(...)
+        numerical_features: list of numerical column names
+        categorical_features: list of categorical column names
+        version: version string stored in the artifact
+        **kwargs: sketch_size, max_categories, min_frequency for StreamingPreprocessor
+
+    Returns:
+        A fitted PreprocessorArtifact.
+    """
+    streaming = StreamingPreprocessor(numerical_features, categorical_features, **kwargs)
+    for df in batches:
+        streaming.partial_fit(df)
+    print(f"Fitted streaming preprocessor on {streaming.rows} rows")
+    return streaming.finalize(version=version)
+
+def transform_streaming(batches, artifact):
+    """Second pass: yields one transformed NumPy array per input DataFrame."""
+    for df in batches:
+        yield artifact.transform(df)
+
+DEFAULT_HASH_KEY = "0123456789123456"
+
+def _canonical_keys(keys):
+    """
+    Converts keys to strings so an id hashes the same whatever dtype it was read as.
+
+    Float columns holding only whole numbers (an int column that picked up a
+    NaN) are written without the trailing ".0" first.
+    """
+    frame = keys.to_frame() if isinstance(keys, pd.Series) else keys
+    columns = []
+    for _, values in frame.items():
+        if pd.api.types.is_float_dtype(values) and (values.dropna() % 1 == 0).all():
+            values = values.astype("Int64")
+        columns.append(values.astype(str))
+    canonical = pd.concat(columns, axis=1)
+    return canonical.iloc[:, 0] if isinstance(keys, pd.Series) else canonical
+
+def hash_buckets(keys, salt=""):
+    """
+    Maps each key to a stable float in [0, 1) with a vectorized 64-bit hash.
+
+    Keys are hashed by their string form, so 7, 7.0 and "7" share a bucket.
+
+    Args:
+        keys: pandas Series, or DataFrame for composite keys
+        salt: optional string (up to 16 characters) to draw an independent split
+
+    Returns:
+        NumPy float64 array with one bucket value per row.
+    """
+    hash_key = salt.ljust(16, "0")[:16] if salt else DEFAULT_HASH_KEY
+    hashes = pd.util.hash_pandas_object(_canonical_keys(keys), index=False, hash_key=hash_key).to_numpy(np.uint64)
+    # top 53 bits give an exactly representable float in [0, 1)
+    return (hashes >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+def assign_splits(buckets, fractions):
+    """Returns the split index of each bucket value for the given split fractions."""
+    thresholds = np.cumsum(fractions) / np.sum(fractions)
+    return np.minimum(np.searchsorted(thresholds, buckets, side="right"), len(fractions) - 1)
+
+def _split_names(fractions, names):
+    if names is not None:
+        return list(names)
+    return ["train", "test"] if len(fractions) == 2 else ["train", "val", "test"][:len(fractions)]
+
+def hash_split(df, key_columns, fractions=(0.8, 0.1, 0.1), names=None, salt="", stratify_column=None):
+    """
+    Deterministically splits a DataFrame by hashing a key column.
+
+    A row's split depends only on its key, never on the other rows, so
+    adding rows never moves existing rows between splits and re-runs do not
+    leak. That holds each stratum's proportions only in expectation, so
+    with stratify_column the keys of each stratum are instead ranked by
+    hash and allocated by rank, which hits the fractions in every stratum
+    (to within one key) but lets rows move when rows are added to their
+    stratum. Rows sharing a key (and stratum) always land in the same split.
+
+    Args:
+        df: pandas DataFrame
+        key_columns: column name or list of names identifying a row (e.g. an id)
+        fractions: split fractions, normalized to sum to 1
+        names: split names, defaults to train/test or train/val/test
+        salt: optional string to draw an independent split
+        stratify_column: optional column whose values are each split in the given fractions
+
+    Returns:
+        Dictionary of split name to DataFrame.
+    """
+    names = _split_names(fractions, names)
+    buckets = hash_buckets(df[key_columns], salt)
+    if stratify_column is not None:
+        # rank distinct bucket values within each stratum and use rank midpoints as the bucket
+        strata = df[stratify_column].to_numpy()
+        ranks = pd.Series(buckets, index=df.index).groupby(strata, dropna=False).rank(method="dense")
+        buckets = ((ranks - 0.5) / ranks.groupby(strata, dropna=False).transform("max")).to_numpy()
+    codes = assign_splits(buckets, fractions)
+
+    return {name: df[codes == i] for i, name in enumerate(names)}
+
+def iter_hash_split(batches, key_columns, fractions=(0.8, 0.1, 0.1), names=None, salt=""):
+    """
+    Streams hash_split over an iterator of DataFrames in a single pass.
+
+    Yields:
+        Dictionary of split name to DataFrame for each input batch.
+    """
+    for df in batches:
+        yield hash_split(df, key_columns, fractions=fractions, names=names, salt=salt)
+
+_worker_preprocessor = None
+
+def _init_transform_worker(preprocessor):
+    """Process pool initializer, ships the fitted preprocessor to each worker once."""
+    global _worker_preprocessor
+    _worker_preprocessor = preprocessor
+
+def _transform_block(name, block, preprocessor=None):
+    """Runs one fitted sub-transformer on one block of rows and columns."""
+    if preprocessor is None:
+        preprocessor = _worker_preprocessor
+    transformer = preprocessor.named_transformers_[name]
+    start = time.perf_counter()
+    result = block.to_numpy() if isinstance(transformer, str) else transformer.transform(block)
+    if sparse.issparse(result):
+        result = result.toarray()
+    return result, time.perf_counter() - start
+
+def parallel_transform(preprocessor, df, n_jobs=None, row_block_size=100_000, backend="thread",
+                       max_dense_bytes=DEFAULT_MAX_DENSE_BYTES):
+    """
+    Transforms df with a fitted ColumnTransformer, one task per column group and row block.
+
+    Each finished block is copied once into its own region of one
+    preallocated output array, so there is no hstack/vstack of partial
+    results. With the process backend the fitted preprocessor is sent to
+    each worker once through the pool initializer rather than with every task.
+    Sparse (one-hot) output is densified block by block into that array, so
+    when the fitted preprocessor produces sparse output the same
+    max_dense_bytes warning as densify is raised for the whole array first.
+
+    Args:
+        preprocessor: fitted ColumnTransformer, e.g. from build_preprocessor
+        df: pandas DataFrame to transform
+        n_jobs: pool size, defaults to the number of CPUs
+        row_block_size: rows per task
+        backend: "thread" or "process"
+        max_dense_bytes: warn before densifying sparse output larger than this
+
+    Returns:
+        Tuple of (dense float64 NumPy array, timings) where timings maps each
+        transformer name to its summed compute seconds, plus "wall" for the whole call.
+    """
+    if backend not in ("thread", "process"):
+        raise ValueError(f"Unsupported backend: {backend}")
+
+    start = time.perf_counter()
+    n_features = sum(s.stop - s.start for s in preprocessor.output_indices_.values())
+    if getattr(preprocessor, "sparse_output_", False):
+        _warn_if_too_dense((len(df), n_features), len(df) * n_features * np.dtype(np.float64).itemsize,
+                           max_dense_bytes)
+    out = np.empty((len(df), n_features), dtype=np.float64)
+    timings = {}
+
+    if backend == "thread":
+        executor = ThreadPoolExecutor(max_workers=n_jobs)
+    else:
+        executor = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_transform_worker,
+                                       initargs=(preprocessor,))
+    with executor:
+        futures = {}
+        for name, transformer, columns in preprocessor.transformers_:
+            output_columns = preprocessor.output_indices_[name]
+            if transformer == "drop" or output_columns.stop == output_columns.start:
+                continue
+            for row_start in range(0, len(df), row_block_size):
+                rows = slice(row_start, row_start + row_block_size)
+                block = df.iloc[rows][columns]
+                if backend == "thread":
+                    future = executor.submit(_transform_block, name, block, preprocessor)
+                else:
+                    future = executor.submit(_transform_block, name, block)
+                futures[future] = (name, rows, output_columns)
+
+        for future in as_completed(futures):
+            name, rows, output_columns = futures[future]
+            result, seconds = future.result()
+            out[rows, output_columns] = result
+            timings[name] = timings.get(name, 0.0) + seconds
+
+    timings["wall"] = time.perf_counter() - start
+    print("Transform timings: " + ", ".join(f"{name}={seconds:.3f}s" for name, seconds in timings.items()))
+    return out, timings
+
+if __name__ == "__main__":
+    # exmaple usage
+    data = {
+        'numerical1': [1, 2, np.nan, 4, 5],
+        'numerical2': [10, 20, 30, 40, 50],
+        'categorical1': ['A','B','A', 'C', 'B'],
+        'categorical2': ['X', 'Y', 'Z', 'X', np.nan],
+        'target': [0, 1, 0, 1, 5]
+    }
+
+    df = pd.DataFrame(data)
+
+    numerical_features = ['numerical1', 'numerical2']
+    categorical_features = ['categorical1', 'categorical2']
+    target_column = 'target'
 
-return processed_df, preprocessor
+    X_train_processed, X_test_processed, y_train, y_test, preprocessor = preprocess_data(df, numerical_features, categorical_features, target_column)
 
-# exmaple usage
-data = {
-    'numerical1': [1, 2, np.nan, 4, 5],
-    'numerical2': [10, 20, 30, 40, 50],
-    'categorical1': ['A','B','A', 'C', 'B'],
-    'categorical2': ['X', 'Y', 'Z', 'X', np.nan],
-    'target': [0, 1, 0, 1, 5]
-}
+    print("X_train_processed shape:" , X_train_processed.shape)
+    print("X_test_processed shape:" , X_test_processed.shape)
 
-df = pd.DataFrame(data) 
+    # Example usage preprocess_dataframe
+    processed_df, preprocessor2 = preprocess_dataframe(df.drop('target', axis=1), numerical_features, categorical_features)
+    print(processed_df.head())
 
-numerical_features = ['numerical1', 'numerical2']
-categorical_features = ['categorical1', 'categorical2']
-target_column = 'target'
+    # Example usage, fit once and reapply a saved artifact
+    artifact = PreprocessorArtifact.fit(df.drop('target', axis=1), numerical_features, categorical_features, version="2024-01-01")
+    artifact.save("preprocessor.json")
+    serving_artifact = PreprocessorArtifact.load("preprocessor.json")
+    print(serving_artifact.transform(df.drop('target', axis=1)).shape)
 
-X_train_processed, X_test_processed, y_train, y_test, preprocessor = preprocess_data(df, numerical_features, categorical_features, target_column)
+    # Example usage, keeping one-hot features sparse
+    X_train_hybrid, X_test_hybrid, _, _, _ = preprocess_data(df, numerical_features, categorical_features, target_column, output="hybrid")
+    print("X_train_hybrid shape:", X_train_hybrid.shape, "one-hot non-zeros:", X_train_hybrid.sparse.nnz)
+    for batch in X_train_hybrid.iter_batches(batch_size=2):
+        print(batch.shape)
 
-print("X_train_processed shape:" , X_train_processed.shape)
-print("X_test_processed shape:" , X_test_processed.shape)
+    # Example usage, out-of-core preprocessing over DataFrame batches
+    batches = [df.iloc[:3], df.iloc[3:]]
+    streaming_artifact = fit_streaming(batches, numerical_features, categorical_features)
+    for processed_batch in transform_streaming(batches, streaming_artifact):
+        print(processed_batch.shape)
 
-# Example usage preprocess_dataframe
-processed_df, preprocessor2 = preprocess_dataframe(df.drop('target', axis=1), numerical_features, categorical_features)
-print(processed_df.head())
+    # Example usage, parallel column-wise transform with a fitted preprocessor
+    fitted = build_preprocessor(numerical_features, categorical_features).fit(df)
+    parallel_output, timings = parallel_transform(fitted, df, n_jobs=2, row_block_size=2)
+    print(parallel_output.shape, timings)
 
+    # Example usage, deterministic hash-based split
+    df['id'] = range(len(df))
+    splits = hash_split(df, 'id', fractions=(0.6, 0.2, 0.2), stratify_column='categorical1')
+    print({name: len(split) for name, split in splits.items()})
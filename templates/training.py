@@ -3,55 +3,810 @@ import numpy as np
 import time
 import logging
 import os
+import json
+import multiprocessing
+import queue
+import shutil
+import socket
+import sys
+import threading
 import schedule
+from collections import deque
+from chunk_processing import process_data_in_chunks
 
 # configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # --- Training Script Boilerplate (TensorFlow/Keras) ---
-def train_model(model, train_data, val_data, epochs=10, batch_size=32):
-    """Train a tensorflow model""" 
+def train_model(model, train_data, val_data, epochs=10, batch_size=32, checkpoint_dir=None,
+                max_to_keep=3, save_freq="epoch", callbacks=None, resume_mid_epoch=False):
+    """
+    Train a tensorflow model
+
+    train_data may be an (x, y) tuple of arrays or a batched tf.data.Dataset
+    (e.g. from build_dataset); batch_size only applies to arrays. x may also
+    be a preprocessing.HybridMatrix (in train_data and val_data), which is fed
+    through its to_dataset() adapter in batch_size row batches.
+
+    With checkpoint_dir, checkpoints are written asynchronously by a
+    CheckpointManager every epoch (or every save_freq steps) and training
+    resumes from the latest valid checkpoint. Resume is epoch-granular: the
+    interrupted epoch restarts from its first batch. Skipping the batches a
+    mid-epoch checkpoint already consumed is only exact when the dataset
+    replays the same order every epoch (build_dataset(deterministic=True)),
+    so it is opt-in with resume_mid_epoch=True.
+    """
+    manager = None
     try: 
         logging.info(f"Starting Model Training...")
+        x, y = train_data if isinstance(train_data, tuple) else (train_data, None)
+        if hasattr(x, "to_dataset"):  # HybridMatrix, densified one batch at a time
+            x, y = x.to_dataset(y, batch_size=batch_size, shuffle=True), None
+        if isinstance(val_data, tuple) and hasattr(val_data[0], "to_dataset"):
+            val_data = val_data[0].to_dataset(val_data[1], batch_size=batch_size)
+        fit_kwargs = {} if isinstance(x, tf.data.Dataset) else {"batch_size": batch_size}
+        callbacks = list(callbacks or [])
+        initial_epoch = 0
+        if checkpoint_dir:
+            monitor = "val_loss" if val_data is not None else "loss"
+            manager = CheckpointManager(checkpoint_dir, max_to_keep=max_to_keep, monitor=monitor)
+            state = manager.restore(model)
+            if state:
+                initial_epoch = state["epoch"]
+                if state["step"] and not (resume_mid_epoch and isinstance(x, tf.data.Dataset)):
+                    logging.info(f"Restarting epoch {initial_epoch + 1} from its first batch")
+                elif state["step"] and initial_epoch < epochs:
+                    model.fit(
+                        x.skip(state["step"]),
+                        validation_data=val_data,
+                        epochs=initial_epoch + 1,
+                        initial_epoch=initial_epoch,
+                        callbacks=callbacks + [CheckpointCallback(manager, save_freq, initial_step=state["step"])],
+                    )
+                    initial_epoch += 1
+            callbacks.append(CheckpointCallback(manager, save_freq))
         history = model.fit(
-            train_data, 
+            x,
+            y,
             validation_data=val_data,
             epochs=epochs,
-            batch_size=batch_size,
+            initial_epoch=initial_epoch,
+            callbacks=callbacks,
+            **fit_kwargs,
         )
         logging.info(f"Model Training Completed.")
         return history
 
     except Exception as e:
-        logging.ERROR(f"Model Training Failed: {e}")
+        logging.error(f"Model Training Failed: {e}")
         return None
-    
-    # Example Usage 
-    def example_training():
-        (x_train, y_train), (x_val, y_val) = tf.keras.datasets.mnist.load_data()
-        x_train = np.expand_dims(x_train, -1).astype("float32")/255.0
-        x_val = np.expand_dims(x_val, -1).astype("float32")/255.0
-        model = tf.keras.Sequential([
-            tf.keras.layers.Conv2D(32, 3, activation='relu', input_shape=(28, 28, 1)),
-            tf.keras.layers.Flatten(),
-            tf.keras.layers.Dense(10, activation='softmax')
-        ])
-
-        model.compile(optimizer="adam", loss='sparse_categorical_crossentropy', metrics=['accuracy'])
-        train_model(model, (x_train, y_train), (x_val, y_val))
 
-# --- Looping Boilerplate ---
-def process_data_in_chunks(data, chunk_size=1000):
-    """ Processes data in chunks to handle large datasets. """
-    try: 
-        logging.INFO(f"Processing data in chunks of size {chunk_size}...")
-        for i in range(0, len(data), chunk_size):
-            chunk = data[i:i + chunk_size]
-            # add chunk processing logic
-            logging.info(f"Processed chunk {i // chunk_size + 1}")
-        logging.info(f"Data Processing Completed")
+    finally:
+        if manager is not None:
+            manager.close()
+
+# Example Usage
+def example_training():
+    (x_train, y_train), (x_val, y_val) = tf.keras.datasets.mnist.load_data()
+    x_train = np.expand_dims(x_train, -1).astype("float32")/255.0
+    x_val = np.expand_dims(x_val, -1).astype("float32")/255.0
+    model = tf.keras.Sequential([
+        tf.keras.layers.Conv2D(32, 3, activation='relu', input_shape=(28, 28, 1)),
+        tf.keras.layers.Flatten(),
+        tf.keras.layers.Dense(10, activation='softmax')
+    ])
+
+    model.compile(optimizer="adam", loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    train_model(model, (x_train, y_train), (x_val, y_val), checkpoint_dir="checkpoints")
+
+# --- Checkpointing Boilerplate ---
+CHECKPOINT_STATE_FILE = "state.json"
+
+def _optimizer_variables(optimizer):
+    variables = optimizer.variables
+    return list(variables() if callable(variables) else variables)
+
+class CheckpointManager:
+    """
+    Asynchronous, atomic checkpoints of model and optimizer state.
+
+    save() only copies the weights to host memory; a background thread writes
+    them to ckpt-<epoch>-<step>.tmp and renames the directory into place, so
+    a checkpoint directory without the .tmp suffix is always complete. The
+    last max_to_keep checkpoints are kept, plus the best one by monitor.
+    """
+
+    def __init__(self, checkpoint_dir, max_to_keep=3, monitor="val_loss", mode="min"):
+        self.checkpoint_dir = checkpoint_dir
+        self.max_to_keep = max_to_keep
+        self.monitor = monitor
+        self.mode = mode
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        for name in os.listdir(checkpoint_dir):
+            if name.endswith(".tmp"):  # left behind by a crash mid-write
+                shutil.rmtree(os.path.join(checkpoint_dir, name), ignore_errors=True)
+        self._queue = queue.Queue(maxsize=2)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, model, epoch, step=0, metrics=None):
+        """Snapshots the model and queues the write; blocks only if two writes are already pending."""
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint write failed: {self._error}") from self._error
+        optimizer = getattr(model, "optimizer", None)
+        snapshot = {
+            "weights": model.get_weights(),
+            "optimizer": [np.array(v) for v in _optimizer_variables(optimizer)] if optimizer else [],
+        }
+        state = {
+            "epoch": int(epoch),
+            "step": int(step),
+            "metrics": {k: float(v) for k, v in (metrics or {}).items()},
+            "time": time.time(),
+        }
+        self._queue.put((snapshot, state))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                self._write(*item)
+            except Exception as e:
+                self._error = e
+                logging.error(f"Checkpoint write failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write(self, snapshot, state):
+        path = os.path.join(self.checkpoint_dir, f"ckpt-{state['epoch']:06d}-{state['step']:08d}")
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        np.savez(os.path.join(tmp_path, "weights.npz"), *snapshot["weights"])
+        np.savez(os.path.join(tmp_path, "optimizer.npz"), *snapshot["optimizer"])
+        with open(os.path.join(tmp_path, CHECKPOINT_STATE_FILE), "w") as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+        self._prune()
+
+    def checkpoints(self):
+        """Returns (path, state) for every complete checkpoint, oldest first."""
+        found = []
+        for name in os.listdir(self.checkpoint_dir):
+            path = os.path.join(self.checkpoint_dir, name)
+            if not name.startswith("ckpt-") or name.endswith(".tmp"):
+                continue
+            try:
+                with open(os.path.join(path, CHECKPOINT_STATE_FILE)) as f:
+                    found.append((path, json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return sorted(found, key=lambda item: (item[1]["epoch"], item[1]["step"]))
+
+    def best(self, checkpoints=None):
+        scored = [c for c in (checkpoints or self.checkpoints()) if self.monitor in c[1]["metrics"]]
+        if not scored:
+            return None
+        pick = min if self.mode == "min" else max
+        return pick(scored, key=lambda item: item[1]["metrics"][self.monitor])
+
+    def latest(self):
+        checkpoints = self.checkpoints()
+        return checkpoints[-1] if checkpoints else None
+
+    def _prune(self):
+        checkpoints = self.checkpoints()
+        keep = {path for path, _ in checkpoints[-self.max_to_keep:]}
+        best = self.best(checkpoints)
+        if best:
+            keep.add(best[0])
+        for path, _ in checkpoints:
+            if path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def restore(self, model, checkpoint=None):
+        """
+        Loads the latest (or the given) checkpoint into model and its optimizer.
+
+        Returns:
+            The checkpoint state (epoch, step, metrics), or None when there is nothing to resume.
+        """
+        self.wait()
+        checkpoint = checkpoint or self.latest()
+        if checkpoint is None:
+            return None
+        path, state = checkpoint
+        with np.load(os.path.join(path, "weights.npz")) as data:
+            model.set_weights([data[f"arr_{i}"] for i in range(len(data.files))])
+        with np.load(os.path.join(path, "optimizer.npz")) as data:
+            values = [data[f"arr_{i}"] for i in range(len(data.files))]
+        optimizer = getattr(model, "optimizer", None)
+        if optimizer is not None and values:
+            variables = _optimizer_variables(optimizer)
+            if len(variables) != len(values) and hasattr(optimizer, "build"):
+                optimizer.build(model.trainable_variables)  # slots are created lazily on the first step
+                variables = _optimizer_variables(optimizer)
+            if len(variables) == len(values):
+                for variable, value in zip(variables, values):
+                    variable.assign(value)
+            else:
+                logging.warning(f"Optimizer state in {path} does not match the model, starting it fresh")
+        logging.info(f"Resumed from {path} (epoch {state['epoch']}, step {state['step']})")
+        return state
+
+    def wait(self):
+        """Blocks until queued checkpoints are written."""
+        self._queue.join()
+        if self._error is not None:
+            raise RuntimeError(f"Checkpoint write failed: {self._error}") from self._error
+
+    def close(self):
+        self._queue.join()
+        self._queue.put(None)
+        self._thread.join()
+
+class CheckpointCallback(tf.keras.callbacks.Callback):
+    """Saves through a CheckpointManager at every epoch end and, with an integer save_freq, every save_freq steps."""
+
+    def __init__(self, manager, save_freq="epoch", initial_step=0):
+        super().__init__()
+        self.manager = manager
+        self.save_freq = save_freq
+        self.initial_step = initial_step
+        self._epoch = 0
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._epoch = epoch
+
+    def on_train_batch_end(self, batch, logs=None):
+        if self.save_freq != "epoch" and (batch + 1) % self.save_freq == 0:
+            self.manager.save(self.model, self._epoch, self.initial_step + batch + 1)
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.initial_step = 0
+        self.manager.save(self.model, epoch + 1, metrics=logs)
+
+    def on_train_end(self, logs=None):
+        self.manager.wait()
+
+# --- Input Pipeline Boilerplate (tf.data) ---
+# rows per block handed from Python to tf.data; rows are split out again by unbatch() in C++
+RECORD_BLOCK_ROWS = 8192
+
+def _npy_records(path, label_column):
+    """Yields (features, labels) blocks of rows from a memory-mapped 2-D .npy shard."""
+    data = np.load(path.decode() if isinstance(path, bytes) else path, mmap_mode="r")
+    features = np.delete(np.arange(data.shape[1]), label_column)
+    for start in range(0, len(data), RECORD_BLOCK_ROWS):
+        block = np.asarray(data[start:start + RECORD_BLOCK_ROWS], dtype=np.float32)
+        yield block[:, features], block[:, label_column]
+
+def _parquet_records(path, feature_columns, label_column):
+    """Yields (features, labels) blocks from a Parquet shard, one record batch at a time, without Python lists."""
+    import pyarrow.parquet as pq
+    path = path.decode() if isinstance(path, bytes) else path
+    feature_columns = [c.decode() if isinstance(c, bytes) else c for c in feature_columns]
+    label_column = label_column.decode() if isinstance(label_column, bytes) else label_column
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=RECORD_BLOCK_ROWS, columns=feature_columns + [label_column]):
+        columns = dict(zip(batch.schema.names, batch.columns))
+        features = np.column_stack([columns[c].to_numpy(zero_copy_only=False) for c in feature_columns])
+        labels = columns[label_column].to_numpy(zero_copy_only=False)
+        yield features.astype(np.float32, copy=False), labels.astype(np.float32, copy=False)
+
+def build_dataset(file_pattern, file_format="tfrecord", batch_size=256, feature_description=None,
+                  label_key="label", feature_columns=None, label_column=-1, shuffle_buffer=10_000,
+                  cache_dir=None, num_parallel_reads=None, num_shards=1, shard_index=0,
+                  drop_remainder=False, seed=None, deterministic=False):
+    """
+    Builds an optimized tf.data input pipeline over sharded files.
+
+    Files are listed, sharded per worker (each worker gets a disjoint,
+    fixed subset of the sorted file list), shuffled, and read concurrently
+    with interleave; records are decoded with a parallel map, cached,
+    shuffled, batched and prefetched so input preparation overlaps training.
+
+    Args:
+        file_pattern: glob of TFRecord, Parquet or .npy shards
+        file_format: "tfrecord", "parquet" or "npy"
+        batch_size: examples per batch
+        feature_description: tf.io.parse_single_example spec for TFRecords
+        label_key: label feature in feature_description
+        feature_columns: Parquet feature columns
+        label_column: Parquet label column name, or .npy label column index
+        shuffle_buffer: shuffle buffer size in examples, 0 disables shuffling
+        cache_dir: None disables caching, "" caches in memory, a directory caches to disk
+        num_parallel_reads: files read concurrently, defaults to AUTOTUNE
+        num_shards, shard_index: file-level sharding across workers
+        drop_remainder: drop the last partial batch (static batch shapes)
+        seed: seed for file and example shuffling
+        deterministic: replay the same order every epoch and run (files and
+            examples shuffled once with seed, order-preserving parallelism),
+            needed for train_model(resume_mid_epoch=True)
+
+    Returns:
+        A batched, prefetched tf.data.Dataset of (features, label).
+    """
+    autotune = tf.data.AUTOTUNE
+    if deterministic and seed is None:
+        seed = 0
+    paths = sorted(tf.io.gfile.glob(file_pattern))
+    if not paths:
+        raise ValueError(f"No files match {file_pattern}")
+    files = tf.data.Dataset.from_tensor_slices(paths)
+    if num_shards > 1:
+        files = files.shard(num_shards, shard_index)
+    files = files.shuffle(len(paths), seed=seed, reshuffle_each_iteration=not deterministic)
+
+    if file_format == "tfrecord":
+        def read(path):
+            return tf.data.TFRecordDataset(path, buffer_size=8 * 1024 * 1024)
+
+        def decode(record):
+            example = tf.io.parse_single_example(record, feature_description)
+            label = example.pop(label_key)
+            return example, label
+    elif file_format in ("npy", "parquet"):
+        if file_format == "npy":
+            generator, args = _npy_records, (label_column,)
+        else:
+            generator, args = _parquet_records, (tuple(feature_columns), label_column)
+
+        def read(path):
+            return tf.data.Dataset.from_generator(
+                generator, args=(path,) + args,
+                output_signature=(tf.TensorSpec(shape=(None, None), dtype=tf.float32),
+                                  tf.TensorSpec(shape=(None,), dtype=tf.float32))).unbatch()
+        decode = None
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+
+    dataset = files.interleave(read, cycle_length=num_parallel_reads or autotune,
+                               num_parallel_calls=autotune, deterministic=deterministic)
+    if decode is not None:
+        dataset = dataset.map(decode, num_parallel_calls=autotune, deterministic=deterministic)
+    if cache_dir is not None:
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        dataset = dataset.cache(os.path.join(cache_dir, f"cache-{shard_index}") if cache_dir else "")
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=not deterministic)
+    dataset = dataset.batch(batch_size, drop_remainder=drop_remainder, num_parallel_calls=autotune,
+                            deterministic=deterministic)
+
+    options = tf.data.Options()
+    options.deterministic = deterministic
+    options.experimental_optimization.map_parallelization = True
+    return dataset.with_options(options).prefetch(autotune)
+
+def benchmark_dataset(dataset, num_epochs=2, max_steps=None):
+    """Iterates a dataset without a model and logs examples/sec per epoch (CPU input throughput)."""
+    results = []
+    for epoch in range(num_epochs):
+        start = time.perf_counter()
+        examples = 0
+        for step, (_, labels) in enumerate(dataset):
+            examples += int(tf.shape(labels)[0])
+            if max_steps and step + 1 >= max_steps:
+                break
+        elapsed = time.perf_counter() - start
+        results.append(examples / elapsed)
+        logging.info(f"Epoch {epoch + 1}: {examples} examples in {elapsed:.2f}s ({examples / elapsed:,.0f} examples/sec)")
+    return results
+
+# example usage
+EXAMPLE_SHARD_DIR = "mnist_shards"
+
+def _write_example_shards(shard_dir=EXAMPLE_SHARD_DIR, num_shards=8):
+    (x_train, y_train), _ = tf.keras.datasets.mnist.load_data()
+    rows = np.hstack([x_train.reshape(len(x_train), -1).astype("float32") / 255.0,
+                      y_train.reshape(-1, 1).astype("float32")])
+    os.makedirs(shard_dir, exist_ok=True)
+    for i, shard in enumerate(np.array_split(rows, num_shards)):
+        np.save(os.path.join(shard_dir, f"part-{i:05d}.npy"), shard)
+
+def _example_model_fn():
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(784,)),
+        tf.keras.layers.Dense(128, activation='relu'),
+        tf.keras.layers.Dense(10, activation='softmax')
+    ])
+    model.compile(optimizer="adam", loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+def _example_dataset_fn(global_batch_size, num_shards, shard_index):
+    return build_dataset(os.path.join(EXAMPLE_SHARD_DIR, "part-*.npy"), file_format="npy",
+                         batch_size=global_batch_size, cache_dir="", num_shards=num_shards,
+                         shard_index=shard_index, drop_remainder=True)
+
+def example_input_pipeline():
+    _write_example_shards()
+    dataset = _example_dataset_fn(256, 1, 0)
+    benchmark_dataset(dataset)
+    train_model(_example_model_fn(), dataset, None, epochs=2)
+
+# --- Multi-Worker Data-Parallel Training Boilerplate (CPU, localhost) ---
+def _free_ports(count):
+    """Reserves count free localhost ports for the worker cluster."""
+    sockets = [socket.socket() for _ in range(count)]
+    for s in sockets:
+        s.bind(("localhost", 0))
+    ports = [s.getsockname()[1] for s in sockets]
+    for s in sockets:
+        s.close()
+    return ports
+
+class _EpochTimer(tf.keras.callbacks.Callback):
+    def __init__(self):
+        super().__init__()
+        self.epoch_seconds = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_seconds.append(time.perf_counter() - self._start)
+
+def _distributed_worker(task_index, workers, model_fn, dataset_fn, global_batch_size, epochs,
+                        steps_per_epoch, checkpoint_dir, threads_per_worker, results):
+    """Runs one worker of the cluster; spawned once per worker by train_distributed."""
+    os.environ["TF_CONFIG"] = json.dumps({"cluster": {"worker": workers},
+                                          "task": {"type": "worker", "index": task_index}})
+    # split the cores between workers instead of letting every worker oversubscribe the box
+    tf.config.threading.set_intra_op_parallelism_threads(threads_per_worker)
+    tf.config.threading.set_inter_op_parallelism_threads(2)
+    manager = None
+    try:
+        strategy = tf.distribute.MultiWorkerMirroredStrategy()
+        with strategy.scope():
+            model = model_fn()
+
+        # the input is sharded by file, so Keras must not shard it again
+        options = tf.data.Options()
+        options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+        dataset = dataset_fn(global_batch_size, len(workers), task_index).repeat().with_options(options)
+
+        timer = _EpochTimer()
+        callbacks = [timer]
+        if checkpoint_dir and task_index == 0:
+            # replicas hold identical weights, so the chief snapshots its local copy without collectives
+            manager = CheckpointManager(checkpoint_dir, monitor="loss")
+            callbacks.append(CheckpointCallback(manager))
+        history = model.fit(dataset, epochs=epochs, steps_per_epoch=steps_per_epoch,
+                            callbacks=callbacks, verbose=2 if task_index == 0 else 0)
+        results.put((task_index, {"history": history.history, "epoch_seconds": timer.epoch_seconds}))
     except Exception as e:
-        logging.error(f"Data Processing Failed: {e}")
+        results.put((task_index, {"error": repr(e)}))
+        raise
+    finally:
+        if manager is not None:
+            manager.close()
+
+def train_distributed(model_fn, dataset_fn, num_workers=2, global_batch_size=256, epochs=10,
+                      steps_per_epoch=100, checkpoint_dir=None, threads_per_worker=None):
+    """
+    Data-parallel training on local CPU worker processes.
+
+    Launches num_workers processes that form a MultiWorkerMirroredStrategy
+    cluster over localhost; gradients are all-reduced every step. Each worker
+    builds the model with model_fn() under the strategy scope and its input
+    with dataset_fn(global_batch_size, num_workers, task_index), which should
+    shard by file (e.g. build_dataset's num_shards/shard_index) and batch with
+    the global batch size. Only the chief (task 0) writes checkpoints, through
+    a CheckpointManager.
+
+    model_fn and dataset_fn must be module-level functions, because workers
+    are started with spawn. steps_per_epoch is required so every worker runs
+    the same number of steps even when shards differ in size.
+
+    Returns:
+        Dictionary with the chief's history, per-epoch seconds and examples/sec.
+    """
+    threads_per_worker = threads_per_worker or max(1, (os.cpu_count() or 1) // num_workers)
+    workers = [f"localhost:{port}" for port in _free_ports(num_workers)]
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = [
+        context.Process(target=_distributed_worker,
+                        args=(i, workers, model_fn, dataset_fn, global_batch_size, epochs,
+                              steps_per_epoch, checkpoint_dir, threads_per_worker, results))
+        for i in range(num_workers)
+    ]
+    logging.info(f"Starting {num_workers} training workers ({threads_per_worker} threads each)...")
+    for process in processes:
+        process.start()
+
+    outputs = {}
+    try:
+        while len(outputs) < num_workers:
+            try:
+                task_index, output = results.get(timeout=5)
+            except queue.Empty:
+                crashed = [i for i, p in enumerate(processes) if p.exitcode not in (None, 0) and i not in outputs]
+                if crashed:
+                    raise RuntimeError(f"Worker {crashed[0]} exited with code {processes[crashed[0]].exitcode}")
+                continue
+            if "error" in output:
+                raise RuntimeError(f"Worker {task_index} failed: {output['error']}")
+            outputs[task_index] = output
+    finally:
+        for process in processes:
+            if len(outputs) < num_workers:
+                process.terminate()
+            process.join()
+
+    chief = outputs[0]
+    # the first epoch includes graph tracing and cluster setup, so leave it out when possible
+    timed = chief["epoch_seconds"][1:] or chief["epoch_seconds"]
+    examples_per_sec = len(timed) * steps_per_epoch * global_batch_size / sum(timed)
+    logging.info(f"{num_workers} workers: {examples_per_sec:,.0f} examples/sec")
+    return {**chief, "num_workers": num_workers, "examples_per_sec": examples_per_sec}
+
+def benchmark_scaling(model_fn, dataset_fn, worker_counts=(1, 2, 4, 8), **kwargs):
+    """Runs train_distributed at each worker count and logs examples/sec and speedup over the first count."""
+    results = {}
+    for num_workers in worker_counts:
+        results[num_workers] = train_distributed(model_fn, dataset_fn, num_workers=num_workers, **kwargs)["examples_per_sec"]
+    baseline = results[worker_counts[0]]
+    for num_workers, examples_per_sec in results.items():
+        logging.info(f"{num_workers} workers: {examples_per_sec:,.0f} examples/sec ({examples_per_sec / baseline:.2f}x)")
+    return results
+
+# example usage
+def example_distributed():
+    _write_example_shards()
+    train_distributed(_example_model_fn, _example_dataset_fn, num_workers=4, epochs=3,
+                      steps_per_epoch=50, checkpoint_dir="distributed_checkpoints")
+    benchmark_scaling(_example_model_fn, _example_dataset_fn, epochs=3, steps_per_epoch=50)
+
+# --- Step-Time Profiling Boilerplate ---
+def _rss_bytes():
+    """Current resident set size, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def _peak_rss_bytes():
+    """Process memory high-water mark, or None where the resource module is not available."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _batch_examples(batch):
+    leaves = tf.nest.flatten(batch)
+    return int(leaves[0].shape[0]) if leaves and getattr(leaves[0], "shape", None) else None
+
+class StepProfiler:
+    """
+    Records per-step wall time split into input wait and compute.
+
+    Each step is appended to a JSONL trace as {"type": "step", ...} and every
+    epoch closes with a {"type": "epoch", ...} summary (step time
+    percentiles, input fraction, examples/sec, memory high-water mark), which
+    is also logged. With chrome_trace_path, input and compute spans are also
+    written in Chrome trace format for chrome://tracing or Perfetto.
+
+    Standalone use wraps any iterable; time spent in next() is input wait and
+    time spent in the loop body is compute:
+
+        for batch in profiler.steps(dataset):
+            train_step(batch)
+    """
+
+    def __init__(self, trace_path=None, chrome_trace_path=None, batch_size=None):
+        self.trace_path = trace_path
+        self.chrome_trace_path = chrome_trace_path
+        self.batch_size = batch_size
+        self.epochs = []
+        self._trace = open(trace_path, "w") if trace_path else None
+        self._chrome_events = [] if chrome_trace_path else None
+        self._origin = time.perf_counter()
+        self._ready = deque()
+        self._epoch = 0
+        self._step = 0
+        self._epoch_steps = []
+        self._epoch_start = None
+
+    # timestamps from the tf.data tail, see profile_dataset
+    def _mark_ready(self, examples):
+        self._ready.append((time.perf_counter(), int(examples)))
+        return 0.0
+
+    def profile_dataset(self, dataset):
+        """
+        Stamps every batch as it leaves the input pipeline.
+
+        Must be the last transformation, because the stamp is taken when the
+        training step asks for the batch. Used by ProfilerCallback to split
+        a Keras step into input wait and compute.
+        """
+        def stamp(*batch):
+            examples = tf.shape(tf.nest.flatten(batch)[0])[0]
+            ready = tf.py_function(self._mark_ready, [examples], tf.float64)
+            with tf.control_dependencies([ready]):
+                batch = tf.nest.map_structure(tf.identity, batch)
+            return batch if len(batch) > 1 else batch[0]
+        return dataset.map(stamp)
+
+    def _pop_ready(self, before):
+        ready = None
+        while self._ready and self._ready[0][0] <= before:
+            ready = self._ready.popleft()
+        return ready
+
+    def start_epoch(self, epoch=None):
+        self._epoch = self._epoch + 1 if epoch is None else epoch
+        self._step = 0
+        self._epoch_steps = []
+        self._epoch_start = time.perf_counter()
+
+    def record(self, start, end, ready=None, examples=None):
+        """Records one step from start to end; ready is when its batch became available."""
+        if self._epoch_start is None:
+            self.start_epoch(0)
+        examples = examples or self.batch_size
+        step_ms = (end - start) * 1000
+        input_ms = max(0.0, (ready - start) * 1000) if ready is not None else None
+        step = {
+            "type": "step",
+            "epoch": self._epoch,
+            "step": self._step,
+            "step_ms": step_ms,
+            "input_ms": input_ms,
+            "compute_ms": step_ms - input_ms if input_ms is not None else None,
+            "examples": examples,
+            "examples_per_sec": examples / (end - start) if examples and end > start else None,
+            "peak_rss_bytes": _peak_rss_bytes(),
+        }
+        self._epoch_steps.append(step)
+        self._step += 1
+        if self._trace:
+            self._trace.write(json.dumps(step) + "\n")
+        if self._chrome_events is not None:
+            split = max(start, ready) if ready is not None else start
+            for name, span_start, span_end in (("input", start, split), ("compute", split, end)):
+                if span_end > span_start:
+                    self._chrome_events.append({
+                        "name": name, "ph": "X", "pid": os.getpid(), "tid": 0,
+                        "ts": (span_start - self._origin) * 1e6, "dur": (span_end - span_start) * 1e6,
+                        "args": {"epoch": self._epoch, "step": step["step"]},
+                    })
+        return step
+
+    def steps(self, iterable):
+        """Yields the batches of iterable and records one step per batch."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                batch = next(iterator)
+            except StopIteration:
+                return
+            ready = time.perf_counter()
+            yield batch
+            self.record(start, time.perf_counter(), ready, _batch_examples(batch))
+
+    def end_epoch(self, logs=None):
+        """Summarizes the current epoch, writes and logs the summary and returns it."""
+        steps = self._epoch_steps
+        if not steps:
+            return None
+        step_ms = np.array([s["step_ms"] for s in steps])
+        input_ms = np.array([s["input_ms"] for s in steps if s["input_ms"] is not None])
+        examples = sum(s["examples"] or 0 for s in steps)
+        seconds = time.perf_counter() - self._epoch_start
+        input_fraction = float(input_ms.sum() / step_ms.sum()) if len(input_ms) and step_ms.sum() else None
+        peak_rss = _peak_rss_bytes()
+        summary = {
+            "type": "epoch",
+            "epoch": self._epoch,
+            "steps": len(steps),
+            "seconds": seconds,
+            "examples": examples,
+            "examples_per_sec": examples / seconds if examples else None,
+            "step_ms_mean": float(step_ms.mean()),
+            "step_ms_p50": float(np.percentile(step_ms, 50)),
+            "step_ms_p95": float(np.percentile(step_ms, 95)),
+            "step_ms_max": float(step_ms.max()),
+            "input_ms_mean": float(input_ms.mean()) if len(input_ms) else None,
+            "input_fraction": input_fraction,
+            "bound": None if input_fraction is None else ("input" if input_fraction > 0.5 else "compute"),
+            "rss_bytes": _rss_bytes(),
+            "peak_rss_bytes": peak_rss,
+            "metrics": {k: float(v) for k, v in (logs or {}).items()},
+        }
+        self.epochs.append(summary)
+        if self._trace:
+            self._trace.write(json.dumps(summary) + "\n")
+            self._trace.flush()
+        message = (f"Epoch {self._epoch}: {len(steps)} steps, step p50 {summary['step_ms_p50']:.1f} ms / "
+                   f"p95 {summary['step_ms_p95']:.1f} ms")
+        if input_fraction is not None:
+            message += f", input wait {input_fraction:.0%} ({summary['bound']}-bound)"
+        if summary["examples_per_sec"]:
+            message += f", {summary['examples_per_sec']:,.0f} examples/sec"
+        if peak_rss:
+            message += f", peak RSS {peak_rss / 2**20:,.0f} MiB"
+        logging.info(message)
+        self._epoch_start = None
+        return summary
+
+    def close(self):
+        if self._epoch_steps and self._epoch_start is not None:
+            self.end_epoch()
+        if self._trace:
+            self._trace.close()
+            self._trace = None
+        if self._chrome_events is not None:
+            with open(self.chrome_trace_path, "w") as f:
+                json.dump({"traceEvents": self._chrome_events, "displayTimeUnit": "ms"}, f)
+            self._chrome_events = None
+
+class ProfilerCallback(tf.keras.callbacks.Callback):
+    """
+    Keras callback that feeds a StepProfiler from model.fit.
+
+    Keras reads the next batch inside the training step, so without help the
+    whole step counts as compute. Pass the training dataset through
+    profiler.profile_dataset() to also get the input-wait split and exact
+    examples per step.
+    """
+
+    def __init__(self, profiler=None, **kwargs):
+        super().__init__()
+        self.profiler = profiler or StepProfiler(**kwargs)
+        self._start = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.profiler.start_epoch(epoch + 1)
+
+    def on_train_batch_begin(self, batch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_train_batch_end(self, batch, logs=None):
+        end = time.perf_counter()
+        ready = self.profiler._pop_ready(end)
+        if ready is None:
+            self.profiler.record(self._start, end)
+        else:
+            self.profiler.record(self._start, end, ready[0], ready[1])
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.profiler.end_epoch(logs)
+
+    def on_train_end(self, logs=None):
+        self.profiler.close()
+
+# example usage
+def example_profiling():
+    _write_example_shards()
+    profiler = StepProfiler(trace_path="train_trace.jsonl", chrome_trace_path="train_trace.json")
+    dataset = profiler.profile_dataset(_example_dataset_fn(256, 1, 0))
+    train_model(_example_model_fn(), dataset, None, epochs=2, callbacks=[ProfilerCallback(profiler)])
+
+    # standalone, e.g. around a custom training loop or an input pipeline on its own
+    standalone = StepProfiler(trace_path="input_trace.jsonl")
+    for epoch in range(2):
+        standalone.start_epoch()
+        for features, labels in standalone.steps(_example_dataset_fn(256, 1, 0)):
+            pass
+        standalone.end_epoch()
+    standalone.close()
+
+# --- Looping Boilerplate ---
+# process_data_in_chunks (imported above) lives in chunk_processing.py, which does not import TensorFlow
 
 # example usage
 def example_loop():
@@ -90,5 +845,8 @@ def example_scheduled():
 # --- Main ---
 if __name__ == "__main__":
     example_training()
+    example_input_pipeline()
+    example_distributed()
+    example_profiling()
     example_loop()
     example_scheduled()
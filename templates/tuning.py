@@ -1,4 +1,13 @@
 from google.cloud import aiplatform
+import itertools
+import json
+import math
+import os
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from chunk_processing import process_pool_context
 
 # project and location settings
 PROJECT_ID = "project_id"
@@ -7,8 +16,6 @@ MODEL_ID = "text-bison@001"
 DATASET_URI ="gs://bucket/fine_tuning_data.jsonl"
 TRAINED_MODEL_DISPLAY_NAME = "fine_tuned_model"
 
-aiplatform.init(project=PROJECT_ID, location=LOCATION)
-
 # Machine Type and Accelerator Configuration for fine tuning
 machine_type = "a2-highgpu-1g"
 accelerator_type = "NVIDIA_TESLA_A100"
@@ -22,22 +29,361 @@ training_parameters = {
 
 }
 
-# Fine-tuning job creation
-job = aiplatform.FineTuningJob(
-    display_name=TRAINED_MODEL_DISPLAY_NAME,
-    model=MODEL_ID,
-    training_data=DATASET_URI,
-    model_parameters=training_parameters,
-    training_fraction_split=0.8,
-    machine_spec=aiplatform.MachineSpec(
-        machine_type=machine_type,
-        accelerator_type=accelerator_type,
-        accelerator_count=accelerator_count,
-    ),
-)
-
-# Run the fine tuning job
-model = job.run()
-
-print(f"Fine-tuned model: {model.resource_name}")
+# --- Remote fine-tuning (Vertex AI) ---
+def run_remote_fine_tuning():
+    """Submits a single Vertex AI fine-tuning job with the fixed training_parameters."""
+    aiplatform.init(project=PROJECT_ID, location=LOCATION)
+
+    # Fine-tuning job creation
+    job = aiplatform.FineTuningJob(
+        display_name=TRAINED_MODEL_DISPLAY_NAME,
+        model=MODEL_ID,
+        training_data=DATASET_URI,
+        model_parameters=training_parameters,
+        training_fraction_split=0.8,
+        machine_spec=aiplatform.MachineSpec(
+            machine_type=machine_type,
+            accelerator_type=accelerator_type,
+            accelerator_count=accelerator_count,
+        ),
+    )
+
+    # Run the fine tuning job
+    model = job.run()
+
+    print(f"Fine-tuned model: {model.resource_name}")
+    return model
+
+# --- Search space ---
+class Uniform:
+    """Float parameter sampled uniformly from [low, high]."""
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def to_unit(self, value):
+        return (value - self.low) / (self.high - self.low)
+
+    def from_unit(self, u):
+        return self.low + u * (self.high - self.low)
+
+class LogUniform(Uniform):
+    """Float parameter sampled uniformly in log space, e.g. learning rates."""
+
+    def to_unit(self, value):
+        return (math.log(value) - math.log(self.low)) / (math.log(self.high) - math.log(self.low))
+
+    def from_unit(self, u):
+        return math.exp(math.log(self.low) + u * (math.log(self.high) - math.log(self.low)))
+
+class IntUniform(Uniform):
+    """Integer parameter sampled uniformly from low to high inclusive."""
+
+    def to_unit(self, value):
+        return (value - self.low + 0.5) / (self.high - self.low + 1)
+
+    def from_unit(self, u):
+        return min(self.high, int(self.low + u * (self.high - self.low + 1)))
+
+def _sample(dimension, rng):
+    """Samples one value; a list or tuple is a categorical choice."""
+    if isinstance(dimension, Uniform):
+        return dimension.from_unit(rng.random())
+    return rng.choice(list(dimension))
+
+def grid(space):
+    """Yields every combination of a space whose dimensions are all lists of values."""
+    names = list(space)
+    for dimension in space.values():
+        if isinstance(dimension, Uniform):
+            raise ValueError("Grid search needs a list of values for every parameter")
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+# --- Samplers ---
+class RandomSampler:
+    def suggest(self, space, observations, rng):
+        return {name: _sample(dimension, rng) for name, dimension in space.items()}
+
+class GridSampler:
+    """Walks the grid in order, skipping points that already have a trial (e.g. after a resume)."""
+
+    def suggest(self, space, observations, rng, tried=()):
+        tried = {json.dumps(params, sort_keys=True) for params in tried}
+        for params in grid(space):
+            if json.dumps(params, sort_keys=True) not in tried:
+                return params
+        return None
+
+class TPESampler:
+    """
+    Tree-structured Parzen estimator, one independent density per parameter.
+
+    After n_startup random trials, observations are split into the best
+    gamma fraction and the rest. n_candidates values are drawn around the
+    good ones and the value with the highest good/bad density ratio is kept.
+    Numeric parameters use Gaussian kernels in unit space (log space for
+    LogUniform); categorical ones use smoothed counts.
+    """
+
+    def __init__(self, n_startup=10, gamma=0.25, n_candidates=24):
+        self.n_startup = n_startup
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+
+    @staticmethod
+    def _density(dimension, value, values):
+        if not isinstance(dimension, Uniform):
+            return (sum(v == value for v in values) + 1) / (len(values) + len(dimension))
+        u = dimension.to_unit(value)
+        bandwidth = max(0.05, 0.5 / math.sqrt(len(values) + 1))
+        kernels = sum(math.exp(-0.5 * ((u - dimension.to_unit(v)) / bandwidth) ** 2)
+                      / (bandwidth * math.sqrt(2 * math.pi)) for v in values)
+        return (kernels + 1.0) / (len(values) + 1)  # uniform prior keeps the density positive
+
+    @staticmethod
+    def _sample_near(dimension, values, rng):
+        if not isinstance(dimension, Uniform):
+            return rng.choice(list(values) + list(dimension))
+        bandwidth = max(0.05, 0.5 / math.sqrt(len(values) + 1))
+        u = dimension.to_unit(rng.choice(values)) + rng.gauss(0, bandwidth)
+        return dimension.from_unit(min(1.0, max(0.0, u)))
+
+    def suggest(self, space, observations, rng):
+        if len(observations) < self.n_startup:
+            return RandomSampler().suggest(space, observations, rng)
+        ranked = sorted(observations, key=lambda item: item[1])
+        n_good = max(1, math.ceil(self.gamma * len(ranked)))
+        good, bad = ranked[:n_good], ranked[n_good:]
+        params = {}
+        for name, dimension in space.items():
+            good_values = [p[name] for p, _ in good]
+            bad_values = [p[name] for p, _ in bad]
+            candidates = [self._sample_near(dimension, good_values, rng) for _ in range(self.n_candidates)]
+            params[name] = max(candidates, key=lambda v: self._density(dimension, v, good_values)
+                               / self._density(dimension, v, bad_values))
+        return params
+
+SAMPLERS = {"grid": GridSampler, "random": RandomSampler, "tpe": TPESampler}
+
+# --- Trial execution (runs in worker processes) ---
+def _init_tuning_worker(threads_per_trial):
+    # set before TensorFlow is imported by the objective, so trials don't oversubscribe the cores
+    for name in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"):
+        os.environ[name] = str(threads_per_trial)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "2"
+
+def _run_trial(objective, params, budget, trial_dir):
+    os.makedirs(trial_dir, exist_ok=True)
+    start = time.perf_counter()
+    score = float(objective(params, budget, trial_dir))
+    return score, time.perf_counter() - start
+
+# --- Study (ASHA over a process pool) ---
+class Study:
+    """
+    Local hyperparameter search with asynchronous successive halving (ASHA).
+
+    objective(params, budget, trial_dir) trains for budget units (e.g.
+    epochs) and returns the score; it must be a module-level function,
+    because trials run in worker processes. Budgets form rungs
+    min_budget, min_budget * eta, ... up to max_budget. Whenever a worker
+    is free, the best 1/eta of the trials finished at a rung are promoted to
+    the next rung; otherwise a new trial starts at the lowest rung, so weak
+    trials never get more than the smallest budget. Checkpointing into
+    trial_dir (e.g. train_model(checkpoint_dir=trial_dir)) lets a promoted
+    trial continue instead of starting over.
+
+    Every trial and result is appended to a JSONL journal. A Study created
+    with an existing journal replays it and resumes, rerunning only work
+    that did not finish.
+    """
+
+    def __init__(self, objective, space, journal_path="tuning_journal.jsonl", sampler="tpe", mode="min",
+                 n_trials=50, min_budget=1, max_budget=27, eta=3, n_workers=None, trial_root="trials", seed=0):
+        if mode not in ("min", "max"):
+            raise ValueError(f"Unsupported mode: {mode}")
+        self.objective = objective
+        self.space = space
+        self.journal_path = journal_path
+        self.sampler = SAMPLERS[sampler]() if isinstance(sampler, str) else sampler
+        self.mode = mode
+        self.n_trials = n_trials
+        self.eta = eta
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.trial_root = trial_root
+        self.rng = random.Random(seed)
+
+        self.budgets = []
+        budget = min_budget
+        while budget < max_budget:
+            self.budgets.append(budget)
+            budget *= eta
+        self.budgets.append(max_budget)
+
+        self.trials = {}
+        self._replay()
+
+    def _key(self, score):
+        """Sort key where lower is better; failed and NaN scores sort last."""
+        if score is None or math.isnan(score):
+            return math.inf
+        return score if self.mode == "min" else -score
+
+    def _log(self, record):
+        with open(self.journal_path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _replay(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted write
+                trial_id = record["trial_id"]
+                if record["event"] == "trial":
+                    self.trials[trial_id] = {"params": record["params"], "scores": {}, "error": None}
+                elif record["event"] == "result":
+                    self.trials[trial_id]["scores"][record["rung"]] = record["score"]
+                elif record["event"] == "error":
+                    self.trials[trial_id]["error"] = record["error"]
+        print(f"Resumed {len(self.trials)} trials from {self.journal_path}")
+
+    def _new_trial(self):
+        observations = [(t["params"], self._key(t["scores"][0])) for t in self.trials.values() if 0 in t["scores"]]
+        if isinstance(self.sampler, GridSampler):
+            params = self.sampler.suggest(self.space, observations, self.rng,
+                                          tried=[t["params"] for t in self.trials.values()])
+        else:
+            params = self.sampler.suggest(self.space, observations, self.rng)
+        if params is None:
+            return None
+        trial_id = len(self.trials)
+        self.trials[trial_id] = {"params": params, "scores": {}, "error": None}
+        self._log({"event": "trial", "trial_id": trial_id, "params": params})
+        return trial_id
+
+    def _next_job(self, running):
+        """Returns (trial_id, rung) for the next piece of work, or None if there is none right now."""
+        running = set(running)
+        busy = {trial_id for trial_id, _ in running}
+        # trials whose first rung was interrupted
+        for trial_id, trial in self.trials.items():
+            if not trial["scores"] and trial["error"] is None and trial_id not in busy:
+                return trial_id, 0
+        # promotions, highest rung first
+        for rung in reversed(range(len(self.budgets) - 1)):
+            finished = [(trial_id, t["scores"][rung]) for trial_id, t in self.trials.items()
+                        if rung in t["scores"] and t["error"] is None]
+            finished.sort(key=lambda item: self._key(item[1]))
+            for trial_id, score in finished[:len(finished) // self.eta]:
+                if rung + 1 not in self.trials[trial_id]["scores"] and trial_id not in busy \
+                        and self._key(score) != math.inf:
+                    return trial_id, rung + 1
+        if len(self.trials) < self.n_trials:
+            trial_id = self._new_trial()
+            if trial_id is not None:
+                return trial_id, 0
+        return None
+
+    def run(self):
+        """Runs the study until every trial has stopped or reached max_budget, and returns the leaderboard."""
+        start = time.perf_counter()
+        threads_per_trial = max(1, (os.cpu_count() or 1) // self.n_workers)
+        with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=process_pool_context(),
+                                 initializer=_init_tuning_worker, initargs=(threads_per_trial,)) as executor:
+            running = {}
+            while True:
+                while len(running) < self.n_workers:
+                    job = self._next_job(running.values())
+                    if job is None:
+                        break
+                    trial_id, rung = job
+                    trial_dir = os.path.join(self.trial_root, f"trial-{trial_id:04d}")
+                    future = executor.submit(_run_trial, self.objective, self.trials[trial_id]["params"],
+                                             self.budgets[rung], trial_dir)
+                    running[future] = job
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    trial_id, rung = running.pop(future)
+                    try:
+                        score, seconds = future.result()
+                    except Exception as e:
+                        self.trials[trial_id]["error"] = repr(e)
+                        self._log({"event": "error", "trial_id": trial_id, "rung": rung, "error": repr(e)})
+                        print(f"Trial {trial_id} failed at budget {self.budgets[rung]}: {e}")
+                        continue
+                    self.trials[trial_id]["scores"][rung] = score
+                    self._log({"event": "result", "trial_id": trial_id, "rung": rung,
+                               "budget": self.budgets[rung], "score": score, "seconds": seconds})
+                    print(f"Trial {trial_id} budget {self.budgets[rung]}: score {score:.5g} ({seconds:.1f}s)")
+
+        print(f"Study finished in {time.perf_counter() - start:.1f}s")
+        return self.leaderboard()
+
+    def leaderboard(self, top=10):
+        """Ranks trials by the highest rung they reached, then by their score there, and prints the top rows."""
+        rows = []
+        for trial_id, trial in self.trials.items():
+            if not trial["scores"]:
+                continue
+            rung = max(trial["scores"])
+            rows.append({"trial_id": trial_id, "rung": rung, "budget": self.budgets[rung],
+                         "score": trial["scores"][rung], "params": trial["params"]})
+        rows.sort(key=lambda row: (-row["rung"], self._key(row["score"])))
+
+        print(f"{'rank':>4}  {'trial':>5}  {'budget':>6}  {'score':>10}  params")
+        for rank, row in enumerate(rows[:top], 1):
+            print(f"{rank:>4}  {row['trial_id']:>5}  {row['budget']:>6}  {row['score']:>10.5g}  {row['params']}")
+        return rows
+
+# example usage
+def _example_objective(params, budget, trial_dir):
+    import tensorflow as tf
+    from training import train_model
+
+    (x_train, y_train), (x_val, y_val) = tf.keras.datasets.mnist.load_data()
+    x_train = x_train[:20000].reshape(-1, 784).astype("float32") / 255.0
+    x_val = x_val.reshape(-1, 784).astype("float32") / 255.0
+    model = tf.keras.Sequential([
+        tf.keras.layers.Input(shape=(784,)),
+        tf.keras.layers.Dense(params["units"], activation="relu"),
+        tf.keras.layers.Dropout(params["dropout"]),
+        tf.keras.layers.Dense(10, activation="softmax"),
+    ])
+    model.compile(optimizer=tf.keras.optimizers.Adam(params["learning_rate"]),
+                  loss="sparse_categorical_crossentropy", metrics=["accuracy"])
+    history = train_model(model, (x_train, y_train[:20000]), (x_val, y_val), epochs=budget,
+                          batch_size=params["batch_size"], checkpoint_dir=trial_dir)
+    if history is None:
+        raise RuntimeError("Training failed")
+    if history.history.get("val_loss"):
+        return history.history["val_loss"][-1]
+    # the trial's checkpoint had already reached this budget (e.g. a crash before the journal write),
+    # so fit ran no epochs; score the restored model instead
+    return model.evaluate(x_val, y_val, verbose=0, return_dict=True)["loss"]
+
+def example_local_tuning():
+    space = {
+        "learning_rate": LogUniform(1e-4, 1e-2),
+        "units": IntUniform(32, 512),
+        "dropout": Uniform(0.0, 0.5),
+        "batch_size": [32, 64, 128],
+    }
+    study = Study(_example_objective, space, journal_path="mnist_tuning.jsonl", sampler="tpe",
+                  n_trials=27, min_budget=1, max_budget=9, eta=3)
+    study.run()
 
+# --- Main ---
+if __name__ == "__main__":
+    example_local_tuning()
+    run_remote_fine_tuning()
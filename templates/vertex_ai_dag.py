@@ -11,7 +11,7 @@ PIPELINE_ROOT = f"{BUCKET_NAME}/pipeline-root"
 # define a component for loading and preprocessing
 @component(
     base_image ="python:3.9",
-    package_to_install=["google-cloud-aiplatform", "pandas", "sklearn"], 
+    package_to_install=["google-cloud-aiplatform", "pandas", "numpy"], 
 )
 
 def load_and_preprocess_data(
@@ -22,24 +22,34 @@ def load_and_preprocess_data(
     output_train_data: Output[Dataset],
     output_val_data: Output[Dataset],
     output_test_data: Output[Dataset],
+    key_column: str = "",
 ):
+    import numpy as np
     import pandas as pd
-    from sklearn.model_selection import train_test_split
 
-    df = pd.read_csv(data.uri)
-    x = df.drop("target_column", axis=1)
-    y = df["target_column"]
-
-X_train, X_temp, y_train, y_temp = train_test_split(X, y, test_size=(val_split + test_split), random_state=42)
-X_val, X_test, y_val, y_test = train_test_split(X_temp, test_size=test_split / (val_split + test_split), random_state=42)
-
-train_df = pd.concat([X_train, y_train], axis=1)
-val_df = pd.concat([X_val, y_val], axis=1)
-test_df = pd.concat([X_test, y_test], axis=1)
-
-train_df.to_csv(output_train_data.path, index=False)
-val_df.to_csv(output_val_data.path, index=False)
-test_df.to_csv(output_test_data.path, index=False)
+    df = pd.read_csv(data_uri)
+
+    # Hash-based split: a row's split depends only on its key (or its full
+    # contents when no key column is given), so it is stable as data grows.
+    keys = df[[key_column]] if key_column else df
+    # hash the string form of each key so its split does not depend on the
+    # dtype pandas inferred (an int id column becomes float once it has a NaN)
+    keys = pd.concat([
+        (column.astype("Int64") if pd.api.types.is_float_dtype(column) and (column.dropna() % 1 == 0).all()
+         else column).astype(str)
+        for _, column in keys.items()], axis=1)
+    hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy(np.uint64)
+    buckets = (hashes >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+    thresholds = np.cumsum([train_split, val_split, test_split]) / (train_split + val_split + test_split)
+    codes = np.minimum(np.searchsorted(thresholds, buckets, side="right"), 2)
+
+    train_df = df[codes == 0]
+    val_df = df[codes == 1]
+    test_df = df[codes == 2]
+
+    train_df.to_csv(output_train_data.path, index=False)
+    val_df.to_csv(output_val_data.path, index=False)
+    test_df.to_csv(output_test_data.path, index=False)
 
 # Define a component for training a classification model
 @component(